@@ -1,23 +1,67 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Upper
 from django_filters import FilterSet
 from django_filters.rest_framework import filters, CharFilter
 
+from core.versions import get_version
 from foods.models import Ingredient, Recipe, Tag
 
+INGREDIENT_SEARCH_LIMIT = 20
+
+_tag_slugs = {}
+
+
+def get_tag_slugs():
+    """Соответствие slug -> id тегов, кэшируется до изменения тегов."""
+    version = get_version(Tag)
+    if _tag_slugs.get('version') != version:
+        _tag_slugs['slugs'] = dict(Tag.objects.values_list('slug', 'id'))
+        _tag_slugs['version'] = version
+    return _tag_slugs['slugs']
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_tag_slugs()]
+
 
 class IngredientSearchFilter(FilterSet):
     """
     FilterSet-класс для фильтрации поиска запросов
     на ингредиенты по заданным параметрам.
+    name - поиск по началу названия,
+    search - поиск по началу, вхождению и похожести названия
+    с учётом опечаток.
     """
 
     name = CharFilter(
         field_name='name',
         lookup_expr='istartswith'
     )
+    search = CharFilter(method='get_search')
 
     class Meta:
         model = Ingredient
-        fields = ('name',)
+        fields = ('name', 'search')
+
+    def get_search(self, queryset, field_name, value):
+        return queryset.annotate(
+            upper_name=Upper('name'),
+            similarity=TrigramSimilarity(Upper('name'), value.upper()),
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                When(name__icontains=value, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField()
+            )
+        ).filter(
+            Q(name__icontains=value)
+            | Q(upper_name__trigram_similar=value.upper())
+        ).order_by(
+            'rank',
+            '-similarity',
+            'name'
+        )[:INGREDIENT_SEARCH_LIMIT]
 
 
 class RecipeFilterSet(FilterSet):
@@ -27,10 +71,9 @@ class RecipeFilterSet(FilterSet):
     """
 
     author = filters.NumberFilter(field_name='author')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='get_tags'
     )
     is_favorited = filters.BooleanFilter(method='get_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
@@ -46,6 +89,15 @@ class RecipeFilterSet(FilterSet):
             'is_in_shopping_cart'
         )
 
+    def get_tags(self, queryset, field_name, value):
+        if not value:
+            return queryset
+        # Тег мог быть удалён после проверки значения фильтра.
+        slugs = get_tag_slugs()
+        return queryset.filter(
+            tag_ids__overlap=[slugs[slug] for slug in value if slug in slugs]
+        )
+
     def get_is_favorited(self, queryset, field_name, value):
         if not self.request.user.is_anonymous and value:
             return queryset.filter(
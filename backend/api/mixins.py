@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import threading
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from core.metrics import record_cache
+from core.versions import get_version
+
+
+class VersionedCatalogMixin:
+    """
+    Mixin для справочников, которые меняются редко.
+    Версия модели задаёт ETag и Last-Modified, на повторный запрос
+    с совпадающей версией отдаётся 304. Полный список хранится
+    в памяти процесса готовым JSON, в том числе сжатым gzip.
+    """
+
+    _bodies = {}
+    _lock = threading.Lock()
+
+    def get_catalog_body(self, version):
+        label = self.queryset.model._meta.label_lower
+        cached = self._bodies.get(label)
+        hit = bool(cached) and cached[0] == version
+        record_cache('catalog_body', int(hit), int(not hit))
+        if hit:
+            return cached[1], cached[2]
+        with self._lock:
+            data = self.get_serializer(self.get_queryset(), many=True).data
+            body = JSONRenderer().render(data)
+            compressed = gzip.compress(body)
+            self._bodies[label] = (version, body, compressed)
+        return body, compressed
+
+    def filtered_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(self.queryset.model)
+        # По этой же версии filtered_list проверяет свои кэши.
+        self.version = version
+        query = request.META.get('QUERY_STRING', '')
+        etag = '"{}-{}-{}"'.format(
+            self.queryset.model._meta.model_name,
+            version,
+            hashlib.md5(query.encode()).hexdigest()[:8]
+        )
+        last_modified = version // 10 ** 9
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        record_cache(
+            'catalog_etag',
+            int(response is not None),
+            int(response is None)
+        )
+        if response is None:
+            if query or request.accepted_renderer.format != 'json':
+                response = self.filtered_list(request, *args, **kwargs)
+            else:
+                body, compressed = self.get_catalog_body(version)
+                if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+                    response = HttpResponse(
+                        compressed,
+                        content_type='application/json'
+                    )
+                    response['Content-Encoding'] = 'gzip'
+                else:
+                    response = HttpResponse(
+                        body,
+                        content_type='application/json'
+                    )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
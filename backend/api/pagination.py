@@ -1,7 +1,201 @@
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.metrics import record_cache
+
+
+def estimate_count(model, using):
+    """Оценка числа строк таблицы из статистики PostgreSQL."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] > 0 else None
+
+
+class CountStrategyPaginator(Paginator):
+    """
+    Paginator, не считающий строки на каждый запрос.
+    Для таблиц без фильтров выше порога берётся оценка PostgreSQL,
+    точное количество кэшируется по подписи запроса.
+    """
+
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if (estimate is not None
+                    and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD):
+                self.count_exact = False
+                return estimate
+        key = 'count:' + hashlib.md5(
+            str(queryset.order_by().values('pk').query).encode()
+        ).hexdigest()
+        count = cache.get(key)
+        record_cache(
+            'pagination_count',
+            int(count is not None),
+            int(count is None)
+        )
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_TIMEOUT)
+        return count
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с номерами страниц,
+    count_exact сообщает, точное ли количество в count.
+    При наличии параметра cursor (для первой страницы пустого)
+    включается пагинация по ключу сортировки модели
+    без подсчёта общего количества записей.
+    """
+
+    django_paginator_class = CountStrategyPaginator
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            return self.paginate_keyset(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return Response(OrderedDict([
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data)
+            ]))
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        return self.get_cursor_link(self.next_values, False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return self.get_cursor_link(self.previous_values, True)
+
+    def get_ordering(self, queryset):
+        return [
+            (name.lstrip('-'), name.startswith('-'))
+            for name in queryset.model._meta.ordering
+        ]
+
+    def get_seek_filter(self, values, reverse):
+        seek = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, previous_name in enumerate(
+                self.field_names[:index]
+            ):
+                condition &= Q(**{previous_name: values[previous]})
+            seek |= condition
+        return seek
+
+    def encode_cursor(self, obj):
+        return [
+            self.fields[name].value_to_string(obj)
+            for name in self.field_names
+        ]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = [
+                self.fields[name].to_python(value)
+                for name, value in zip(self.field_names, cursor['v'])
+            ]
+            if len(values) != len(self.field_names):
+                raise ValueError
+            return bool(cursor['r']), values
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_keyset(self, queryset, request):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        self.field_names = [name for name, _ in self.ordering]
+        self.fields = {
+            name: queryset.model._meta.get_field(name)
+            for name in self.field_names
+        }
+        page_size = self.get_page_size(request)
+        reverse, values = self.decode_cursor(request)
+
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filter(values, reverse))
+        queryset = queryset.order_by(*[
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.ordering
+        ])
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        has_next = has_more if not reverse else values is not None
+        has_previous = has_more if reverse else values is not None
+        self.next_values = (
+            self.encode_cursor(results[-1])
+            if has_next and results else None
+        )
+        self.previous_values = (
+            self.encode_cursor(results[0])
+            if has_previous and results else None
+        )
+        return results
+
+    def get_cursor_link(self, values, reverse):
+        if values is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param
+        )
+        cursor = base64.urlsafe_b64encode(
+            json.dumps({'r': reverse, 'v': values}).encode()
+        ).decode()
+        return replace_query_param(url, self.cursor_query_param, cursor)
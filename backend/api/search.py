@@ -0,0 +1,53 @@
+import bisect
+import threading
+
+from foods.models import Ingredient
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientPrefixIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса
+    для поиска по началу названия без запросов к базе данных.
+    Строится при первом обращении и перестраивается
+    при изменении версии модели Ingredient, которую передаёт view.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._ids = []
+        self._rows = {}
+
+    def _build(self, version):
+        rows = {}
+        entries = []
+        for row in Ingredient.objects.values(
+            'id',
+            'name',
+            'measurement_unit'
+        ):
+            rows[row['id']] = row
+            entries.append((normalize(row['name']), row['id']))
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._ids = [id for _, id in entries]
+        self._rows = rows
+        self._version = version
+
+    def search(self, prefix, version):
+        with self._lock:
+            if self._version != version:
+                self._build(version)
+            keys, ids, rows = self._keys, self._ids, self._rows
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\U0010ffff', start)
+        return [rows[id] for id in sorted(ids[start:end])]
+
+
+ingredient_index = IngredientPrefixIndex()
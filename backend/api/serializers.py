@@ -1,13 +1,32 @@
 import base64
+import binascii
+import re
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from djoser.serializers import UserCreateSerializer, UserSerializer
 
+from core.fragments import invalidate_recipe_fragments
+from foods.images import schedule_variants
 from foods.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
-                          ShoppingCart, Tag, TagForRecipe)
+                          ShoppingCart, ShoppingCartTotal, Tag)
 from users.models import Subscription, User
 
+BASE64_CHUNK_SIZE = 64 * 1024
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+BULK_RECIPES_LIMIT = 100
+
+
+def image_url(request, image):
+    if not image:
+        return None
+    if request is None:
+        return image.url
+    return request.build_absolute_uri(image.url)
+
 
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -25,9 +44,12 @@ class CustomUserSerializer(UserSerializer):
         read_only_fields = ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
             return False
+        user = request.user
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Subscription.objects.filter(
             author=obj.id,
             follower=user
@@ -49,6 +71,7 @@ class CustomUserCreateSerializer(UserCreateSerializer):
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -65,10 +88,24 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def get_image(self, obj):
+        return image_url(
+            self.context.get('request'),
+            obj.image_thumbnail or obj.image
+        )
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT
+    )
+
 
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -101,9 +138,6 @@ class SubscriptionSerializer(CustomUserSerializer):
             queryset = queryset[:int(recipes_limit)]
         return ShortRecipeSerializer(queryset, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
-
 
 class TagSerializer(serializers.ModelSerializer):
 
@@ -140,13 +174,65 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class Base64ImageField(serializers.ImageField):
+    """
+    Поле изображения, принимающее файл из multipart/form-data
+    или строку data:image/...;base64,... из JSON.
+    Base64 декодируется частями во временный файл.
+    """
+
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+        'too_many_pixels': ('Изображение не должно содержать больше '
+                            '{max_pixels} пикселей.'),
+    }
+
+    def decode(self, data):
+        header_end = data.index(';base64,')
+        ext = data[:header_end].split('/')[-1]
+        start = header_end + len(';base64,')
+        file = TemporaryUploadedFile('temp.' + ext, 'image/' + ext, 0, None)
+        rest = ''
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            # Символы вне алфавита, например переносы строк,
+            # b64decode пропускает, поэтому они убираются до деления
+            # на группы по 4 символа. Неполная группа переходит
+            # в следующую часть.
+            chunk = rest + NOT_BASE64.sub(
+                '',
+                data[position:position + BASE64_CHUNK_SIZE]
+            )
+            end = len(chunk) - len(chunk) % 4
+            rest = chunk[end:]
+            file.write(base64.b64decode(chunk[:end]))
+            file.size = file.tell()
+            if file.size > settings.RECIPE_IMAGE_MAX_SIZE:
+                self.fail(
+                    'too_large',
+                    max_size=settings.RECIPE_IMAGE_MAX_SIZE
+                )
+        if rest:
+            raise binascii.Error('Incorrect padding')
+        file.seek(0)
+        return file
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
+            try:
+                data = self.decode(data)
+            except (ValueError, binascii.Error):
+                self.fail('invalid_image')
+        elif (getattr(data, 'size', None)
+              and data.size > settings.RECIPE_IMAGE_MAX_SIZE):
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                'too_many_pixels',
+                max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+        return file
 
 
 class IngredientForRecipeSerializer(serializers.ModelSerializer):
@@ -174,6 +260,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -186,27 +273,57 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
             'name',
             'image',
+            'images',
             'text',
             'cooking_time'
         )
         read_only_fields = (
             'author',
+            'images',
+            'favorites_count',
             'is_favorited',
             'is_in_shopping_cart'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        data = super().to_representation(instance)
+        image_variant = self.context.get('image_variant')
+        if image_variant:
+            data['image'] = data['images'][image_variant]
+        return data
+
+    def get_images(self, obj):
+        request = self.context.get('request')
+        return {
+            'original': image_url(request, obj.image),
+            'medium': image_url(request, obj.image_medium or obj.image),
+            'thumbnail': image_url(
+                request,
+                obj.image_thumbnail or obj.image
+            ),
+        }
+
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
             return False
+        user = request.user
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
             return False
+        user = request.user
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return ShoppingCart.objects.filter(user=user, recipe=obj).exists()
 
 
@@ -250,6 +367,16 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipe_ingredient',
+                queryset=IngredientForRecipe.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
         serializer = RecipeSerializer(
             instance,
             context={
@@ -258,20 +385,77 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
         return serializer.data
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image:
+                image.close()
+
+    def check_ingredients(self, ids):
+        if Ingredient.objects.filter(id__in=ids).count() != len(ids):
+            raise serializers.ValidationError('Такого ингредиента нет!')
+
     def create_ingredients(self, ingredients, recipe):
-        for element in ingredients:
-            id = element['id']
-            ingredient = Ingredient.objects.filter(id=id).first()
-            if not ingredient:
-                raise serializers.ValidationError('Такого ингредиента нет!')
-            amount = element['amount']
-            IngredientForRecipe.objects.create(
-                ingredient=ingredient, recipe=recipe, amount=amount
+        self.check_ingredients({element['id'] for element in ingredients})
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(
+                ingredient_id=element['id'],
+                recipe=recipe,
+                amount=element['amount']
+            )
+            for element in ingredients
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Приводит ингредиенты рецепта к новому списку,
+        изменяя только отличающиеся записи.
+        Возвращает True, если ингредиенты изменились.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientForRecipe.objects.filter(recipe=recipe)
+        }
+        new_amounts = {
+            element['id']: element['amount'] for element in ingredients
+        }
+        added = new_amounts.keys() - current.keys()
+        removed = current.keys() - new_amounts.keys()
+        changed = [
+            row for id, row in current.items()
+            if id in new_amounts and row.amount != new_amounts[id]
+        ]
+        old_amounts = {id: row.amount for id, row in current.items()}
+
+        if added:
+            self.check_ingredients(added)
+            IngredientForRecipe.objects.bulk_create(
+                IngredientForRecipe(
+                    ingredient_id=id,
+                    recipe=recipe,
+                    amount=new_amounts[id]
+                )
+                for id in added
             )
+        if removed:
+            IngredientForRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        if changed:
+            for row in changed:
+                row.amount = new_amounts[row.ingredient_id]
+            IngredientForRecipe.objects.bulk_update(changed, ('amount',))
+        if added or removed or changed:
+            ShoppingCartTotal.update_recipe(recipe, old_amounts, new_amounts)
+        return bool(added or removed or changed)
 
     def create_tags(self, tags, recipe):
         recipe.tags.set(tags)
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -280,16 +464,36 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data, author=user)
         self.create_ingredients(ingredients, recipe)
         self.create_tags(tags, recipe)
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        IngredientForRecipe.objects.filter(recipe=instance).delete()
-        TagForRecipe.objects.filter(recipe=instance).delete()
-
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        self.create_tags(validated_data.pop('tags'), instance)
-
-        return super().update(instance, validated_data)
+        ingredients_changed = False
+        if 'ingredients' in validated_data:
+            ingredients_changed = self.update_ingredients(
+                validated_data.pop('ingredients'),
+                instance
+            )
+        if 'tags' in validated_data:
+            self.create_tags(validated_data.pop('tags'), instance)
+        if 'image' in validated_data:
+            for field in settings.RECIPE_IMAGE_VARIANTS:
+                validated_data[field] = ''
+            schedule_variants(instance)
+
+        # Сохраняются только переданные поля: копии изображения
+        # и счётчики могут измениться параллельно с редактированием.
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        if validated_data:
+            instance.save(update_fields=validated_data.keys())
+        elif ingredients_changed:
+            # bulk_create и bulk_update не отправляют сигналы, а save()
+            # без полей не отправляет post_save, который меняет версию
+            # фрагмента, поэтому версия меняется здесь.
+            invalidate_recipe_fragments([instance.id])
+        return instance
 
     def validate(self, data):
         try:
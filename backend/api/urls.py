@@ -1,9 +1,9 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (APIFavorite, APIShoppingCart, APISubscription,
-                    IngredientViewSet, ListAPISubscription, RecipeViewSet,
-                    TagViewSet)
+from .views import (APIBulkFavorite, APIBulkShoppingCart, APIFavorite,
+                    APIShoppingCart, APISubscription, IngredientViewSet,
+                    ListAPISubscription, RecipeViewSet, TagViewSet)
 
 
 food = DefaultRouter()
@@ -12,13 +12,43 @@ food.register('ingredients', IngredientViewSet)
 food.register('recipes', RecipeViewSet)
 
 urlpatterns = [
-    path('recipes/download_shopping_cart/', APIShoppingCart.as_view()),
-    path('recipes/<int:id>/shopping_cart/', APIShoppingCart.as_view()),
-    path('recipes/<int:id>/favorite/', APIFavorite.as_view()),
+    path(
+        'recipes/download_shopping_cart/',
+        APIShoppingCart.as_view(),
+        name='download_shopping_cart'
+    ),
+    path(
+        'recipes/shopping_cart/',
+        APIBulkShoppingCart.as_view(),
+        name='shopping_cart_bulk'
+    ),
+    path(
+        'recipes/favorite/',
+        APIBulkFavorite.as_view(),
+        name='favorite_bulk'
+    ),
+    path(
+        'recipes/<int:id>/shopping_cart/',
+        APIShoppingCart.as_view(),
+        name='shopping_cart'
+    ),
+    path(
+        'recipes/<int:id>/favorite/',
+        APIFavorite.as_view(),
+        name='favorite'
+    ),
     path('', include(food.urls)),
 
-    path('users/subscriptions/', ListAPISubscription.as_view()),
-    path('users/<int:id>/subscribe/', APISubscription.as_view()),
+    path(
+        'users/subscriptions/',
+        ListAPISubscription.as_view(),
+        name='subscriptions'
+    ),
+    path(
+        'users/<int:id>/subscribe/',
+        APISubscription.as_view(),
+        name='subscribe'
+    ),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,25 +1,41 @@
+import csv
+import json
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import StreamingHttpResponse
 from rest_framework.generics import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, status, views, viewsets
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from core.db import delete_returning, insert_ignore, insert_ignore_many
+from core.fragments import recipe_fragment_keys
+from core.metrics import record_cache
 from users.models import Subscription
 from foods.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
-                          ShoppingCart, Tag)
+                          ShoppingCart, ShoppingCartTotal, Tag)
 from .filters import IngredientSearchFilter, RecipeFilterSet
+from .mixins import VersionedCatalogMixin
 from .pagination import CustomPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import CSVRenderer, Echo, PlainTextRenderer
+from .search import ingredient_index
 from .serializers import (CreateRecipeSerializer, IngredientSerializer,
-                          RecipeSerializer, ShortRecipeSerializer,
-                          SubscriptionSerializer, TagSerializer)
+                          RecipeIdsSerializer, RecipeSerializer,
+                          ShortRecipeSerializer, SubscriptionSerializer,
+                          TagSerializer)
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     View-класс для взаимодействия с моделью Tag.
     GET-запросы.
@@ -31,7 +47,8 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCatalogMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """
     View-класс для взаимодействия с моделью Ingredient.
     Get-запросы.
@@ -45,6 +62,12 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientSearchFilter
 
+    def filtered_list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and not request.query_params.get('search'):
+            return Response(ingredient_index.search(name, self.version))
+        return super().filtered_list(request, *args, **kwargs)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """
@@ -54,9 +77,115 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(
+                'id',
+                'author',
+                'pub_date',
+                'favorites_count',
+                'fragment_version'
+            )
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                author=OuterRef('author'),
+                follower=user
+            ))
+        )
+
+    def get_fragments(self, recipes):
+        """
+        Не зависящая от пользователя часть рецептов из кэша.
+        Отсутствующие фрагменты сериализуются одним набором запросов.
+        """
+        keys = recipe_fragment_keys(recipes)
+        fragments = cache.get_many(keys.values())
+        missing = [id for id, key in keys.items() if key not in fragments]
+        record_cache('recipe_fragments', len(fragments), len(missing))
+        if missing:
+            recipes = Recipe.objects.filter(
+                id__in=missing
+            ).select_related('author').prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.all()),
+                Prefetch(
+                    'recipe_ingredient',
+                    queryset=IngredientForRecipe.objects.select_related(
+                        'ingredient'
+                    )
+                )
+            )
+            new = {
+                keys[recipe['id']]: recipe
+                for recipe in RecipeSerializer(recipes, many=True).data
+            }
+            cache.set_many(new, settings.RECIPE_FRAGMENT_TIMEOUT)
+            fragments.update(new)
+        return {id: fragments[key] for id, key in keys.items()}
+
+    def serialize_recipes(self, recipes):
+        """
+        Собирает ответ из кэшированных фрагментов, дополняя их
+        признаками текущего пользователя из аннотаций запроса.
+        """
+        fragments = self.get_fragments(recipes)
+        image_variant = self.get_serializer_context().get(
+            'image_variant',
+            'original'
+        )
+        data = []
+        for recipe in recipes:
+            item = dict(fragments[recipe.id])
+            item['author'] = dict(
+                item['author'],
+                is_subscribed=getattr(recipe, 'author_is_subscribed', False)
+            )
+            item['favorites_count'] = recipe.favorites_count
+            item['is_favorited'] = getattr(recipe, 'is_favorited', False)
+            item['is_in_shopping_cart'] = getattr(
+                recipe,
+                'is_in_shopping_cart',
+                False
+            )
+            item['images'] = {
+                name: url and self.request.build_absolute_uri(url)
+                for name, url in item['images'].items()
+            }
+            item['image'] = item['images'][image_variant]
+            data.append(item)
+        return data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.serialize_recipes(page))
+        return Response(self.serialize_recipes(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(self.serialize_recipes([self.get_object()])[0])
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_variant'] = 'thumbnail'
+        return context
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeSerializer
@@ -74,10 +203,28 @@ class ListAPISubscription(generics.ListAPIView):
     pagination_class = CustomPagination
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     def get_queryset(self):
+        recipes = Recipe.objects.all()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:recipes_limit]
+            ))
         return User.objects.filter(
             following_authors__follower=self.request.user
-        )
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        ).order_by('id')
 
 
 class APISubscription(views.APIView):
@@ -91,35 +238,39 @@ class APISubscription(views.APIView):
     def post(self, request, id):
         user = self.request.user
         author = get_object_or_404(User, id=id)
-        if Subscription.objects.filter(
-            author=author,
-            follower=user
-        ).exists() or author == user:
-            return Response(
-                {'errors': ('Ошибка подписки на пользователя. '
-                            'Подписка на себя или вы уже подписаны.')},
-                status=status.HTTP_400_BAD_REQUEST
+        if author == user:
+            return self.already_subscribed()
+        with transaction.atomic():
+            subscription = insert_ignore(
+                Subscription,
+                author=author,
+                follower=user
             )
+        if subscription is None:
+            return self.already_subscribed()
         serializer = SubscriptionSerializer(
             author,
             context={'request': request}
         )
-        Subscription.objects.create(
-            author=author,
-            follower=user
-        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def already_subscribed(self):
+        return Response(
+            {'errors': ('Ошибка подписки на пользователя. '
+                        'Подписка на себя или вы уже подписаны.')},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     def delete(self, request, id):
         user = self.request.user
-        author = get_object_or_404(User, id=id)
-        subscription = Subscription.objects.filter(
-            author=author,
-            follower=user
-        )
-        if subscription.exists():
-            subscription.delete()
+        with transaction.atomic():
+            deleted = delete_returning(Subscription.objects.filter(
+                author_id=id,
+                follower=user
+            ))
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(User, id=id)
         return Response(
             {'errors': 'Вы не были подписаны на этого пользователя'},
             status=status.HTTP_400_BAD_REQUEST
@@ -137,10 +288,9 @@ class APIFavorite(views.APIView):
     def post(self, request, id):
         user = self.request.user
         recipe = get_object_or_404(Recipe, id=id)
-        if Favorite.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
+        with transaction.atomic():
+            favorite = insert_ignore(Favorite, user=user, recipe=recipe)
+        if favorite is None:
             return Response(
                 {'errors': 'Вы уже добавили в избранное этот рецепт'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -149,19 +299,18 @@ class APIFavorite(views.APIView):
             recipe,
             context={'request': request}
         )
-        Favorite.objects.create(user=user, recipe=recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
         user = self.request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        favorite = Favorite.objects.filter(
-            user=user,
-            recipe=recipe
-        )
-        if favorite.exists():
-            favorite.delete()
+        with transaction.atomic():
+            deleted = delete_returning(Favorite.objects.filter(
+                user=user,
+                recipe_id=id
+            ))
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=id)
         return Response(
             {'errors': 'Вы не добавляли этот рецепт в избранное.'},
             status=status.HTTP_400_BAD_REQUEST
@@ -172,49 +321,78 @@ class APIShoppingCart(views.APIView):
     """
     View-класс для взаимодействия с моделью ShoppingCart.
     GET-, POST- и DELETE-запросы.
+    Список покупок отдаётся в формате txt, csv или json
+    в зависимости от параметра format.
     """
 
     permission_classes = (permissions.IsAuthenticated,)
+    renderer_classes = (JSONRenderer, PlainTextRenderer, CSVRenderer)
 
     def get(self, request):
         user = self.request.user
-        ingredients = IngredientForRecipe.objects.filter(
-            recipe__shoppinglist_recipe__user=user
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(sum=Sum('amount'))
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name').iterator()
+
+        renderer = request.accepted_renderer
+        if 'format' not in request.query_params:
+            renderer = PlainTextRenderer()
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        stream = getattr(self, f'stream_{renderer.format}')
+        response = StreamingHttpResponse(
+            stream(ingredients),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
+        return response
 
-        unique_ingredients = {}
+    def stream_txt(self, ingredients):
         for ingredient in ingredients:
-            if (ingredient['ingredient__name'] not in unique_ingredients.keys()
-                or ingredient.get('ingredient__measurement_unit')
-                    != unique_ingredients.get(
-                        ingredient['ingredient__name'])[1]):
-                unique_ingredients[ingredient['ingredient__name']] = [
-                    ingredient['sum'],
-                    ingredient['ingredient__measurement_unit']
-                ]
-            else:
-                unique_ingredients[ingredient['ingredient__name']][0] \
-                    += ingredient['sum']
-
-        shopping_cart = ''
-        for ingredient_name, ingredient_values in unique_ingredients.items():
-            shopping_cart += (
-                f'{ingredient_name} - '
-                f'{ingredient_values[0]} '
-                f'{ingredient_values[1]}\n'
+            yield (
+                f'{ingredient["ingredient__name"]} - '
+                f'{ingredient["amount"]} '
+                f'{ingredient["ingredient__measurement_unit"]}\n'
             )
-        return HttpResponse(shopping_cart, content_type='text/plain')
+
+    def stream_csv(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['amount'],
+                ingredient['ingredient__measurement_unit']
+            ))
+
+    def stream_json(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'amount': ingredient['amount'],
+                'measurement_unit': ingredient['ingredient__measurement_unit']
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
 
     def post(self, request, id):
         user = self.request.user
         recipe = get_object_or_404(Recipe, id=id)
-        if ShoppingCart.objects.filter(
-            user=user,
-            recipe=recipe
-        ).exists():
+        with transaction.atomic():
+            shopping_cart = insert_ignore(
+                ShoppingCart,
+                user=user,
+                recipe=recipe
+            )
+        if shopping_cart is None:
             return Response(
                 {'errors': ('Вы уже добавили'
                             'в список покупок'
@@ -223,24 +401,98 @@ class APIShoppingCart(views.APIView):
             )
         serializer = ShortRecipeSerializer(
             recipe,
-            data=request.data,
             context={'request': request}
         )
-        if serializer.is_valid():
-            ShoppingCart.objects.create(user=user, recipe=recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
         user = self.request.user
-        recipe = get_object_or_404(Recipe, id=id)
-        Favorite = ShoppingCart.objects.filter(
-            user=user,
-            recipe=recipe
-        )
-        if Favorite.exists():
-            Favorite.delete()
+        with transaction.atomic():
+            deleted = delete_returning(ShoppingCart.objects.filter(
+                user=user,
+                recipe_id=id
+            ))
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=id)
         return Response(
             {'errors': 'Вы не добавляли этот рецепт в список покупок.'},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+
+class APIBulkRecipeRelation(views.APIView):
+    """
+    Базовый View-класс для массового добавления рецептов
+    в избранное или список покупок. POST- и DELETE-запросы
+    со списком id рецептов в поле recipes.
+    """
+
+    permission_classes = (permissions.IsAuthenticated,)
+    model = None
+    # Обновляет данные, зависящие от связей пользователя:
+    # on_change(id пользователя, id рецептов, 1 или -1).
+    on_change = None
+
+    def get_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    def results(self, recipe_ids, statuses, default):
+        return Response({'results': [
+            {'id': id, 'status': statuses.get(id, default)}
+            for id in recipe_ids
+        ]})
+
+    def post(self, request):
+        user = request.user
+        recipe_ids = self.get_recipe_ids(request)
+        existing = set(Recipe.objects.filter(
+            id__in=recipe_ids
+        ).values_list('id', flat=True))
+        with transaction.atomic():
+            added = {relation.recipe_id for relation in insert_ignore_many([
+                self.model(user=user, recipe_id=id)
+                for id in recipe_ids if id in existing
+            ])}
+            if added:
+                self.on_change(user.id, added, 1)
+        statuses = dict.fromkeys(existing, 'exists')
+        statuses.update(dict.fromkeys(added, 'added'))
+        return self.results(recipe_ids, statuses, 'not_found')
+
+    def delete(self, request):
+        user = request.user
+        recipe_ids = self.get_recipe_ids(request)
+        with transaction.atomic():
+            removed = {relation.recipe_id for relation in delete_returning(
+                self.model.objects.filter(user=user, recipe_id__in=recipe_ids),
+                send_signals=False
+            )}
+            if removed:
+                self.on_change(user.id, removed, -1)
+        statuses = dict.fromkeys(removed, 'removed')
+        if len(removed) < len(recipe_ids):
+            statuses.update(dict.fromkeys(Recipe.objects.filter(
+                id__in=set(recipe_ids) - removed
+            ).values_list('id', flat=True), 'missing'))
+        return self.results(recipe_ids, statuses, 'not_found')
+
+
+class APIBulkFavorite(APIBulkRecipeRelation):
+    """
+    View-класс для массового добавления рецептов в избранное.
+    """
+
+    model = Favorite
+    on_change = staticmethod(Favorite.update_recipes)
+
+
+class APIBulkShoppingCart(APIBulkRecipeRelation):
+    """
+    View-класс для массового добавления рецептов в список покупок.
+    """
+
+    model = ShoppingCart
+    on_change = staticmethod(ShoppingCartTotal.add_recipes)
@@ -0,0 +1,112 @@
+from django.db import connections, router
+from django.db.models import sql
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+
+def insert_ignore_many(objs):
+    """
+    Вставляет объекты одним запросом INSERT ... ON CONFLICT DO NOTHING,
+    как bulk_create(ignore_conflicts=True), но возвращает только
+    действительно созданные объекты. Сигналы не отправляются.
+    """
+    if not objs:
+        return []
+    model = type(objs[0])
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    fields = [
+        field for field in opts.concrete_fields
+        if field is not opts.pk
+    ]
+    row = '({})'.format(', '.join(['%s'] * len(fields)))
+    query = 'INSERT INTO {} ({}) VALUES {} ' \
+            'ON CONFLICT DO NOTHING RETURNING {}'.format(
+                qn(opts.db_table),
+                ', '.join(qn(field.column) for field in fields),
+                ', '.join([row] * len(objs)),
+                ', '.join(
+                    qn(field.column) for field in opts.concrete_fields
+                )
+            )
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in objs
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    field_names = [field.attname for field in opts.concrete_fields]
+    return [model.from_db(using, field_names, row) for row in rows]
+
+
+def insert_ignore(model, **values):
+    """
+    Вставляет строку одним запросом INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает созданный объект или None, если такая строка уже есть.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = model._meta
+    instance = model(**values)
+    fields = [opts.get_field(name) for name in values]
+    query = 'INSERT INTO {} ({}) VALUES ({}) ' \
+            'ON CONFLICT DO NOTHING RETURNING {}'.format(
+                qn(opts.db_table),
+                ', '.join(qn(field.column) for field in fields),
+                ', '.join(['%s'] * len(fields)),
+                qn(opts.pk.column)
+            )
+    params = [
+        field.get_db_prep_save(getattr(instance, field.attname), connection)
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    instance.pk = row[0]
+    instance._state.adding = False
+    instance._state.db = using
+    post_save.send(
+        sender=model,
+        instance=instance,
+        created=True,
+        update_fields=None,
+        raw=False,
+        using=using
+    )
+    return instance
+
+
+def delete_returning(queryset, send_signals=True):
+    """
+    Удаляет строки одним запросом DELETE ... RETURNING.
+    Возвращает список удалённых объектов. Сигналы pre_delete
+    и post_delete отправляются уже после запроса, поэтому
+    обработчики не должны искать эти строки в базе.
+    """
+    model = queryset.model
+    using = queryset.db
+    connection = connections[using]
+    fields = model._meta.concrete_fields
+    query = queryset.query.clone()
+    query.__class__ = sql.DeleteQuery
+    delete_sql, params = query.get_compiler(using).as_sql()
+    delete_sql += ' RETURNING {}'.format(', '.join(
+        connection.ops.quote_name(field.column) for field in fields
+    ))
+    with connection.cursor() as cursor:
+        cursor.execute(delete_sql, params)
+        rows = cursor.fetchall()
+    field_names = [field.attname for field in fields]
+    deleted = [model.from_db(using, field_names, row) for row in rows]
+    if send_signals:
+        for signal in (pre_delete, post_delete):
+            for instance in deleted:
+                signal.send(sender=model, instance=instance, using=using)
+    return deleted
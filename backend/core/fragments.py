@@ -0,0 +1,37 @@
+from django.db.models import F
+
+from core.versions import get_versions
+from foods.models import Ingredient, Recipe, Tag
+
+RECIPE_FRAGMENT_KEY = 'recipe-fragment:{}.{}:{}.{}'
+
+
+def recipe_fragment_keys(recipes):
+    """
+    Ключи кэша для не зависящей от пользователя части рецептов.
+    В ключ входят версии тегов и ингредиентов, поэтому их изменение
+    сбрасывает сразу все фрагменты, и fragment_version рецепта,
+    прочитанная вместе со страницей.
+    """
+    tag_version, ingredient_version = get_versions(Tag, Ingredient)
+    return {
+        recipe.id: RECIPE_FRAGMENT_KEY.format(
+            tag_version,
+            ingredient_version,
+            recipe.id,
+            recipe.fragment_version
+        )
+        for recipe in recipes
+    }
+
+
+def invalidate_recipe_fragments(recipe_ids):
+    """
+    Увеличивает fragment_version рецептов в текущей транзакции.
+    Новый ключ становится виден вместе с изменёнными данными,
+    а фрагмент, который параллельный запрос собрал из старых данных,
+    записывается под старым ключом и больше не читается.
+    """
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        fragment_version=F('fragment_version') + 1
+    )
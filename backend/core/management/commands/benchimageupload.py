@@ -0,0 +1,96 @@
+import base64
+import io
+import json
+import math
+import os
+import tracemalloc
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.client import MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from api.serializers import Base64ImageField
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды замера памяти при загрузке изображения рецепта:
+    base64 в JSON с декодированием целиком, base64 в JSON
+    с декодированием частями и multipart/form-data.
+    """
+
+    help = 'Замер памяти при загрузке изображения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=8,
+            help='Примерный размер изображения в мегабайтах'
+        )
+
+    def make_image(self, size):
+        side = int(math.sqrt(size * 1024 * 1024 / 3))
+        buffer = io.BytesIO()
+        Image.frombytes(
+            'RGB',
+            (side, side),
+            os.urandom(side * side * 3)
+        ).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def peak(self, function):
+        tracemalloc.start()
+        try:
+            file = function()
+            file.close()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def handle(self, *args, **options):
+        image = self.make_image(options['size'])
+        json_body = json.dumps({
+            'image': 'data:image/png;base64,'
+            + base64.b64encode(image).decode()
+        }).encode()
+        multipart_body = encode_multipart('BoUnDaRy', {
+            'image': ContentFile(image, name='image.png')
+        })
+        del image
+        field = Base64ImageField()
+
+        def base64_whole():
+            data = json.loads(json_body)['image']
+            format, imgstr = data.split(';base64,')
+            return field.to_internal_value(ContentFile(
+                base64.b64decode(imgstr),
+                name='temp.png'
+            ))
+
+        def base64_chunks():
+            return field.to_internal_value(json.loads(json_body)['image'])
+
+        def multipart():
+            request = RequestFactory().generic(
+                'POST',
+                '/api/recipes/',
+                multipart_body,
+                content_type=f'{MULTIPART_CONTENT}; boundary=BoUnDaRy'
+            )
+            return field.to_internal_value(request.FILES['image'])
+
+        self.stdout.write(
+            f'Размер тела запроса: JSON {len(json_body) / 2 ** 20:.1f} МБ, '
+            f'multipart {len(multipart_body) / 2 ** 20:.1f} МБ'
+        )
+        for name, function in (
+            ('base64 целиком', base64_whole),
+            ('base64 частями', base64_chunks),
+            ('multipart/form-data', multipart),
+        ):
+            self.stdout.write(
+                f'{name}: пик памяти {self.peak(function) / 2 ** 20:.1f} МБ'
+            )
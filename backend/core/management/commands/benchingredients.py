@@ -0,0 +1,103 @@
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from api.filters import IngredientSearchFilter
+from foods.models import Ingredient
+
+QUERIES = (
+    'мол',
+    'молоко',
+    'малако',
+    'сыр',
+    'курин',
+    'куринная грудка',
+    'помидр',
+    'ябл',
+    'сахар',
+    'масло сливоч',
+)
+INDEX_SCAN = re.compile(r'Index (?:Only )?Scan (?:using|on) (\w+)')
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды замера скорости поиска ингредиентов.
+    Каталог временно дополняется до заданного размера,
+    после замера все изменения откатываются.
+    Для каждого режима выводятся индексы из планов запросов.
+    """
+
+    help = 'Замер скорости поиска ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def scale_catalog(self, size):
+        base = list(Ingredient.objects.values_list(
+            'name',
+            'measurement_unit'
+        ))
+        if not base:
+            base = [(query, 'г') for query in QUERIES]
+        count = len(base)
+        new = []
+        copy = 1
+        while count + len(new) < size:
+            for name, unit in base:
+                new.append(Ingredient(
+                    name=f'{name} {copy}'[:200],
+                    measurement_unit=unit
+                ))
+                if count + len(new) >= size:
+                    break
+            copy += 1
+        Ingredient.objects.bulk_create(new, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE foods_ingredient')
+
+    def search(self, params, query):
+        return IngredientSearchFilter(
+            {params: query},
+            queryset=Ingredient.objects.all()
+        ).qs
+
+    def plan(self, params):
+        indexes = set()
+        for query in QUERIES:
+            plan = self.search(params, query).explain()
+            indexes.update(
+                INDEX_SCAN.findall(plan) or ['последовательный просмотр']
+            )
+        return ', '.join(sorted(indexes))
+
+    def measure(self, params):
+        timings = []
+        for query in QUERIES:
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                list(self.search(params, query))
+                timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return (
+            statistics.median(timings),
+            timings[int(len(timings) * 0.95) - 1]
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with transaction.atomic():
+            self.scale_catalog(options['size'])
+            total = Ingredient.objects.count()
+            for params in ('name', 'search'):
+                p50, p95 = self.measure(params)
+                self.stdout.write(
+                    f'{params}: ингредиентов {total}, '
+                    f'p50 {p50:.2f} мс, p95 {p95:.2f} мс, '
+                    f'план: {self.plan(params)}'
+                )
+            transaction.set_rollback(True)
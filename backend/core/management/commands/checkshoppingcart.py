@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from foods.models import IngredientForRecipe, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды проверки сумм списков покупок.
+    Пересчитывает суммы по рецептам в списках покупок
+    и сравнивает их с таблицей ShoppingCartTotal.
+    """
+
+    help = 'Проверка и восстановление сумм списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Перезаписать таблицу пересчитанными суммами'
+        )
+
+    def expected_totals(self):
+        return {
+            (total['recipe__shoppinglist_recipe__user'],
+             total['ingredient']): total['amount']
+            for total in IngredientForRecipe.objects.filter(
+                recipe__shoppinglist_recipe__isnull=False
+            ).values(
+                'recipe__shoppinglist_recipe__user',
+                'ingredient'
+            ).annotate(amount=Sum('amount')).order_by().iterator()
+        }
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = self.expected_totals()
+            actual = {
+                (user, ingredient): amount
+                for user, ingredient, amount in (
+                    ShoppingCartTotal.objects.select_for_update().values_list(
+                        'user',
+                        'ingredient',
+                        'amount'
+                    ).iterator()
+                )
+            }
+            differences = 0
+            for key in sorted(expected.keys() | actual.keys()):
+                if expected.get(key) != actual.get(key):
+                    differences += 1
+                    self.stdout.write(
+                        f'Пользователь {key[0]}, ингредиент {key[1]}: '
+                        f'ожидалось {expected.get(key)}, '
+                        f'в таблице {actual.get(key)}'
+                    )
+            self.stdout.write(f'Расхождений: {differences}')
+            if differences and options['fix']:
+                ShoppingCartTotal.objects.all().delete()
+                ShoppingCartTotal.objects.bulk_create(
+                    (
+                        ShoppingCartTotal(
+                            user_id=user,
+                            ingredient_id=ingredient,
+                            amount=amount
+                        )
+                        for (user, ingredient), amount in expected.items()
+                    ),
+                    batch_size=1000
+                )
+                self.stdout.write('Суммы списков покупок пересчитаны')
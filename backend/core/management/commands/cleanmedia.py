@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foods.models import Recipe
+
+IMAGE_FIELDS = ('image', 'image_thumbnail', 'image_medium')
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды удаления файлов из MEDIA_ROOT,
+    на которые не ссылается ни один рецепт.
+    """
+
+    help = 'Удаление неиспользуемых медиафайлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе заданного числа секунд'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены'
+        )
+
+    def handle(self, *args, **options):
+        used = set()
+        for names in Recipe.objects.values_list(*IMAGE_FIELDS).iterator():
+            used.update(name for name in names if name)
+        threshold = time.time() - options['min_age']
+        removed = 0
+        for root, dirs, files in os.walk(settings.MEDIA_ROOT):
+            for file in files:
+                path = os.path.join(root, file)
+                name = os.path.relpath(path, settings.MEDIA_ROOT)
+                if name in used or os.path.getmtime(path) > threshold:
+                    continue
+                removed += 1
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    os.remove(path)
+        self.stdout.write(f'Неиспользуемых файлов: {removed}')
@@ -0,0 +1,358 @@
+import csv
+import io
+import itertools
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from core.versions import bump_version
+from foods.models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                          ShoppingCart, ShoppingCartTotal, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+RECIPE_TAGS = (1, 3)
+RECIPE_INGREDIENTS = (3, 12)
+PUB_DATE_SPREAD = 365 * 24 * 60 * 60
+
+
+def zipf_cum_weights(size, exponent):
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class ZipfSampler:
+    """
+    Выбор элементов с частотой, убывающей по закону Ципфа.
+    Популярность назначается элементам в случайном порядке,
+    чтобы она не совпадала с порядком первичных ключей.
+    """
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = zipf_cum_weights(len(self.population), exponent)
+
+    def choice(self):
+        return self.rng.choices(
+            self.population,
+            cum_weights=self.cum_weights
+        )[0]
+
+    def sample(self, k):
+        return set(self.rng.choices(
+            self.population,
+            cum_weights=self.cum_weights,
+            k=k
+        ))
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды генерации тестовых данных.
+    Создаёт воспроизводимый по seed набор пользователей, рецептов,
+    избранного, списков покупок и подписок пачками bulk_create и COPY.
+    Ингредиенты берутся из загруженного каталога.
+    """
+
+    help = 'Генерация тестовых данных для замеров производительности'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Среднее число рецептов в избранном пользователя'
+        )
+        parser.add_argument(
+            '--cart',
+            type=int,
+            default=5,
+            help='Среднее число рецептов в списке покупок пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions',
+            type=int,
+            default=10,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Показатель распределения Ципфа для популярности'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix',
+            default='user',
+            help='Префикс имён создаваемых пользователей'
+        )
+        parser.add_argument(
+            '--password',
+            default='password',
+            help='Пароль всех создаваемых пользователей'
+        )
+
+    def log(self, message):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
+
+    def batched(self, objects):
+        iterator = iter(objects)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def bulk_create(self, model, objects):
+        created = 0
+        for batch in self.batched(objects):
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        return created
+
+    def copy_rows(self, model, fields, rows):
+        """
+        Загружает кортежи значений пачками через COPY,
+        минуя создание объектов моделей.
+        """
+        qn = connection.ops.quote_name
+        query = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            qn(model._meta.db_table),
+            ', '.join(qn(model._meta.get_field(name).column)
+                      for name in fields)
+        )
+        created = 0
+        with connection.cursor() as cursor:
+            for batch in self.batched(rows):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(query, buffer)
+                created += len(batch)
+        return created
+
+    def create_tags(self, count):
+        existing = Tag.objects.count()
+        if existing < count:
+            Tag.objects.bulk_create(
+                [
+                    Tag(
+                        name=f'Тег {number}',
+                        color=f'#{number * 0x9e3779 % 0x1000000:06x}',
+                        slug=f'tag-{number}'
+                    )
+                    for number in range(existing, count)
+                ],
+                ignore_conflicts=True
+            )
+            bump_version(Tag)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count, prefix, password):
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                'укажите другой --prefix'
+            )
+        password = make_password(password)
+        self.bulk_create(User, (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password
+            )
+            for number in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('id').values_list('id', flat=True))
+
+    def placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (230, 120, 40)).save(buffer, 'JPEG')
+        return default_storage.save(
+            'generated.jpg',
+            ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, count, authors, tags, ingredients):
+        image = self.placeholder_image()
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            recipes = []
+            recipe_tags = []
+            recipe_ingredients = []
+            for number in range(start, min(start + self.batch_size, count)):
+                recipe_tags.append(sorted(self.rng.sample(
+                    tags,
+                    min(self.rng.randint(*RECIPE_TAGS), len(tags))
+                )))
+                recipe_ingredients.append(ingredients.sample(
+                    self.rng.randint(*RECIPE_INGREDIENTS)
+                ))
+                recipes.append(Recipe(
+                    author_id=authors.choice(),
+                    name=f'Рецепт {number}',
+                    image=image,
+                    text=f'Описание рецепта {number}',
+                    cooking_time=self.rng.randint(5, 180),
+                    tag_ids=recipe_tags[-1]
+                ))
+            Recipe.objects.bulk_create(recipes)
+            self.copy_rows(Recipe.tags.through, ('recipe', 'tag'), (
+                (recipe.id, tag)
+                for recipe, tag_ids in zip(recipes, recipe_tags)
+                for tag in tag_ids
+            ))
+            self.copy_rows(
+                IngredientForRecipe,
+                ('recipe', 'ingredient', 'amount'),
+                (
+                    (recipe.id, ingredient, self.rng.randint(1, 500))
+                    for recipe, ingredient_ids in zip(
+                        recipes,
+                        recipe_ingredients
+                    )
+                    for ingredient in ingredient_ids
+                )
+            )
+            recipe_ids.extend(recipe.id for recipe in recipes)
+            self.log(f'Рецептов: {len(recipe_ids)}')
+        self.spread_pub_dates(recipe_ids[0], recipe_ids[-1])
+        return recipe_ids
+
+    def spread_pub_dates(self, first_id, last_id):
+        """
+        Разносит даты публикации на год назад. Смещение зависит
+        только от id, поэтому порядок ленты воспроизводим.
+        """
+        table = connection.ops.quote_name(Recipe._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET pub_date = %s - make_interval('
+                'secs => (id * 7919) %% %s) WHERE id BETWEEN %s AND %s',
+                [timezone.now(), PUB_DATE_SPREAD, first_id, last_id]
+            )
+
+    def create_relations(self, model, user_field, target_field, users,
+                         sampler, mean, exclude_self=False):
+        return self.copy_rows(model, (user_field, target_field), (
+            (user, target)
+            for user in users
+            for target in sampler.sample(self.rng.randint(0, 2 * mean))
+            if not exclude_self or target != user
+        ))
+
+    def refresh_counters(self, users):
+        qn = connection.ops.quote_name
+        recipe_table = qn(Recipe._meta.db_table)
+        favorite_table = qn(Favorite._meta.db_table)
+        user_table = qn(User._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {recipe_table} SET favorites_count = f.total '
+                f'FROM (SELECT recipe_id, COUNT(*) AS total '
+                f'FROM {favorite_table} GROUP BY recipe_id) f '
+                f'WHERE {recipe_table}.id = f.recipe_id'
+            )
+            cursor.execute(
+                f'UPDATE {user_table} SET recipes_count = r.total '
+                f'FROM (SELECT author_id, COUNT(*) AS total '
+                f'FROM {recipe_table} GROUP BY author_id) r '
+                f'WHERE {user_table}.id = r.author_id'
+            )
+            cursor.execute(
+                'INSERT INTO {} (user_id, ingredient_id, amount) '
+                'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+                'FROM {} cart JOIN {} item '
+                'ON item.recipe_id = cart.recipe_id '
+                'WHERE cart.user_id = ANY(%s) '
+                'GROUP BY cart.user_id, item.ingredient_id'.format(
+                    qn(ShoppingCartTotal._meta.db_table),
+                    qn(ShoppingCart._meta.db_table),
+                    qn(IngredientForRecipe._meta.db_table)
+                ),
+                [users]
+            )
+
+    def handle(self, *args, **options):
+        self.started = time.perf_counter()
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        if self.batch_size < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Каталог ингредиентов пуст, выполните loadingredients'
+            )
+        zipf = options['zipf']
+        with transaction.atomic():
+            tags = self.create_tags(options['tags'])
+            users = self.create_users(
+                options['users'],
+                options['prefix'],
+                options['password']
+            )
+            self.log(f'Пользователей: {len(users)}, тегов: {len(tags)}')
+            recipes = self.create_recipes(
+                options['recipes'],
+                ZipfSampler(self.rng, users, zipf),
+                tags,
+                ZipfSampler(self.rng, ingredient_ids, zipf)
+            )
+            popular_recipes = ZipfSampler(self.rng, recipes, zipf)
+            favorites = self.create_relations(
+                Favorite,
+                'user',
+                'recipe',
+                users,
+                popular_recipes,
+                options['favorites']
+            )
+            self.log(f'Избранное: {favorites}')
+            carts = self.create_relations(
+                ShoppingCart,
+                'user',
+                'recipe',
+                users,
+                popular_recipes,
+                options['cart']
+            )
+            self.log(f'Списки покупок: {carts}')
+            subscriptions = self.create_relations(
+                Subscription,
+                'follower',
+                'author',
+                users,
+                ZipfSampler(self.rng, users, zipf),
+                options['subscriptions'],
+                exclude_self=True
+            )
+            self.log(f'Подписки: {subscriptions}')
+            self.refresh_counters(users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.log('Готово')
@@ -1,25 +1,204 @@
 import csv
+import io
+import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from core.versions import bump_version
 from foods.models import Ingredient
 
+JSON_CHUNK_SIZE = 64 * 1024
+FORMATS = ('csv', 'json', 'jsonl')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or row[:2] == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+def read_json_values(file):
+    """
+    Построчно разбирает JSON-массив, не загружая файл целиком:
+    объекты по очереди декодируются из буфера через raw_decode.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise CommandError('Ожидался JSON-массив ингредиентов')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if started and buffer[:1] == ',':
+            buffer = buffer[1:]
+            continue
+        if started and buffer[:1] == ']':
+            return
+        if buffer:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный JSON')
+            else:
+                yield value
+                buffer = buffer[end:]
+                continue
+        elif eof:
+            raise CommandError('Некорректный JSON')
+        chunk = file.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_jsonl_values(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def rows_from_values(values):
+    for value in values:
+        if isinstance(value, dict):
+            yield value.get('name'), value.get('measurement_unit')
+        else:
+            yield value[0], value[1]
+
 
 class Command(BaseCommand):
-    """Класс для команды скачивания ингредиентов"""
+    """
+    Класс для команды скачивания ингредиентов.
+    Читает CSV, JSON или JSON Lines потоком, отбрасывает дубликаты
+    и загружает ингредиенты пачками без повторной вставки
+    уже существующих пар название + единица измерения.
+    """
 
     help = 'Загрузка ингредиентов'
 
-    def handle(self, *args, **kwargs):
-        with open(
-            './data/ingredients.csv',
-            'r',
-            encoding='utf-8'
-        ) as file:
-            reader = csv.reader(file)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='./data/ingredients.csv',
+            help='Файл с ингредиентами'
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной пачке'
+        )
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загружать через COPY во временную таблицу'
+        )
+
+    def read_rows(self, file, file_format):
+        if file_format == 'csv':
+            return read_csv(file)
+        if file_format == 'json':
+            return rows_from_values(read_json_values(file))
+        return rows_from_values(read_jsonl_values(file))
+
+    def unique_batches(self, rows, batch_size):
+        seen = set()
+        batch = []
+        for name, measurement_unit in rows:
+            self.read += 1
+            name = (name or '').strip()
+            measurement_unit = (measurement_unit or '').strip()
+            if not name or not measurement_unit:
+                continue
+            key = (name, measurement_unit)
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def load_bulk(self, batches):
+        for batch in batches:
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+
+    def load_copy(self, batches):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_staging '
+                'ON CONFLICT DO NOTHING'
+            )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            file_format = os.path.splitext(path)[1].lstrip('.').lower()
+            if file_format not in FORMATS:
+                raise CommandError(
+                    f'Не удалось определить формат файла {path}'
+                )
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть положительным')
+        self.read = 0
+        started = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as file:
+            with transaction.atomic():
+                before = Ingredient.objects.count()
+                batches = self.unique_batches(
+                    self.read_rows(file, file_format),
+                    options['batch_size']
                 )
-        print('Ингредиенты добавлены в базу данных')
+                if options['copy']:
+                    self.load_copy(batches)
+                else:
+                    self.load_bulk(batches)
+                created = Ingredient.objects.count() - before
+        # bulk_create и COPY не отправляют сигналы,
+        # поэтому версия каталога обновляется вручную.
+        if created:
+            bump_version(Ingredient)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Прочитано строк: {self.read}, добавлено: {created}, '
+            f'{elapsed:.2f} с, {self.read / max(elapsed, 1e-9):.0f} строк/с'
+        )
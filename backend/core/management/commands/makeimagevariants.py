@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from foods.images import make_variants
+from foods.models import Recipe
+
+
+class Command(BaseCommand):
+    """Класс для команды создания уменьшенных копий изображений рецептов"""
+
+    help = 'Создание уменьшенных копий изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии для всех рецептов'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_thumbnail='')
+        count = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            make_variants(recipe_id)
+            count += 1
+        self.stdout.write(f'Обработано рецептов: {count}')
@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from foods.models import Favorite, Recipe
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    """
+    Класс для команды пересчёта денормализованных счётчиков.
+    Сверяет Recipe.favorites_count и User.recipes_count
+    с фактическим числом строк и исправляет расхождения пачками.
+    """
+
+    help = 'Пересчёт счётчиков избранного и рецептов'
+
+    counters = (
+        (Recipe, 'favorites_count', Favorite.objects.all(), 'recipe'),
+        (User, 'recipes_count', Recipe.objects.all(), 'author'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк, проверяемых за одну транзакцию'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения'
+        )
+
+    def recount(self, model, field, related, related_field, options):
+        batch_size = options['batch_size']
+        drifted = 0
+        last_pk = 0
+        while True:
+            pks = list(model.objects.filter(pk__gt=last_pk).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return drifted
+            last_pk = pks[-1]
+            with transaction.atomic():
+                rows = list(model.objects.select_for_update().filter(
+                    pk__in=pks
+                ).annotate(
+                    actual=count_subquery(related, related_field)
+                ).only('pk', field))
+                rows = [
+                    row for row in rows
+                    if getattr(row, field) != row.actual
+                ]
+                for row in rows:
+                    setattr(row, field, row.actual)
+                if rows and not options['dry_run']:
+                    model.objects.bulk_update(rows, (field,))
+            drifted += len(rows)
+
+    def handle(self, *args, **options):
+        for model, field, related, related_field in self.counters:
+            drifted = self.recount(
+                model,
+                field,
+                related,
+                related_field,
+                options
+            )
+            self.stdout.write(
+                f'{model._meta.object_name}.{field}: расхождений {drifted}'
+            )
@@ -0,0 +1,62 @@
+import os
+
+from prometheus_client import (REGISTRY, CollectorRegistry, Counter,
+                               Histogram, multiprocess)
+
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, float('inf')
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float('inf'))
+
+REQUESTS = Counter(
+    'foodgram_http_requests',
+    'Количество HTTP-запросов',
+    ('route', 'method', 'status')
+)
+LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки HTTP-запроса',
+    ('route', 'method')
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер ответа',
+    ('route', 'method'),
+    buckets=SIZE_BUCKETS
+)
+DB_QUERIES = Histogram(
+    'foodgram_http_request_db_queries',
+    'Количество SQL-запросов на HTTP-запрос',
+    ('route', 'method'),
+    buckets=QUERY_BUCKETS
+)
+DB_DURATION = Histogram(
+    'foodgram_http_request_db_duration_seconds',
+    'Суммарное время SQL-запросов на HTTP-запрос',
+    ('route', 'method')
+)
+CACHE = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшам приложения',
+    ('cache', 'result')
+)
+
+
+def record_cache(name, hits, misses):
+    """Учитывает попадания и промахи кэша name."""
+    if hits:
+        CACHE.labels(name, 'hit').inc(hits)
+    if misses:
+        CACHE.labels(name, 'miss').inc(misses)
+
+
+def get_registry():
+    """
+    Реестр для выдачи метрик. При запуске нескольких процессов
+    gunicorn метрики собираются из файлов в PROMETHEUS_MULTIPROC_DIR.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
@@ -0,0 +1,129 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import (DB_DURATION, DB_QUERIES, LATENCY, REQUESTS,
+                      RESPONSE_SIZE)
+from .queries import QueryCounter
+
+logger = logging.getLogger('core.sql')
+
+
+@contextmanager
+def count_queries(counter):
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield
+
+
+def view_name(request):
+    match = request.resolver_match
+    if match is None:
+        return None
+    view = getattr(match.func, 'cls', match.func)
+    return match.view_name or view.__name__
+
+
+class SQLInstrumentationMiddleware:
+    """
+    Считает SQL-запросы каждого запроса и их время, отдаёт их
+    в заголовке Server-Timing и пишет предупреждение, если один
+    и тот же вид запроса выполняется больше SQL_REPEAT_THRESHOLD раз.
+    Включается настройкой SQL_INSTRUMENTATION, иначе не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SQL_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.repeat_threshold = settings.SQL_REPEAT_THRESHOLD
+
+    def __call__(self, request):
+        counter = QueryCounter(self.repeat_threshold)
+        start = time.perf_counter()
+        with count_queries(counter):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        response['Server-Timing'] = (
+            f'db;desc="{counter.count} queries";'
+            f'dur={counter.elapsed * 1000:.1f}, '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        view = view_name(request)
+        for sql, count, field in counter.repeated():
+            logger.warning(
+                'SQL-запрос выполнен %s раз: view=%s field=%s sql=%s',
+                count,
+                view,
+                field,
+                sql,
+                extra={'sql_repeat': {
+                    'view': view,
+                    'field': field,
+                    'count': count,
+                    'sql': sql,
+                    'path': request.path,
+                }}
+            )
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики Prometheus по каждому запросу: количество,
+    время, размер ответа, число и время SQL-запросов.
+    Метрики группируются по имени маршрута, а не по пути.
+    Для потоковых ответов замер завершается после отдачи
+    последнего фрагмента.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with count_queries(counter):
+            response = self.get_response(request)
+        labels = (view_name(request) or 'unresolved', request.method)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                labels,
+                response.status_code,
+                counter,
+                start
+            )
+        else:
+            self.observe(
+                labels,
+                response.status_code,
+                len(response.content),
+                counter,
+                start
+            )
+        return response
+
+    def stream(self, content, labels, status, counter, start):
+        size = 0
+        try:
+            with count_queries(counter):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.observe(labels, status, size, counter, start)
+
+    def observe(self, labels, status, size, counter, start):
+        REQUESTS.labels(*labels, status).inc()
+        LATENCY.labels(*labels).observe(time.perf_counter() - start)
+        RESPONSE_SIZE.labels(*labels).observe(size)
+        DB_QUERIES.labels(*labels).observe(counter.count)
+        DB_DURATION.labels(*labels).observe(counter.elapsed)
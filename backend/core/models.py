@@ -0,0 +1,32 @@
+from django.db import models
+
+
+class DataVersion(models.Model):
+    label = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f'DataVersion. {self.label}: {self.version}'
+
+
+class DenormalizedFieldsMixin:
+    """
+    Mixin для моделей с денормализованными полями, которые меняются
+    только запросами UPDATE с F() или сигналами. Сохранение строки
+    целиком не перезаписывает их значениями, прочитанными раньше.
+    """
+
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            skipped = self.get_deferred_fields().union(
+                self.denormalized_fields
+            )
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,63 @@
+import re
+import sys
+import time
+from collections import Counter
+
+from rest_framework.fields import Field
+
+IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+def fingerprint(sql):
+    """SQL-запрос без значений, одинаковый для запросов одного вида."""
+    return NUMBER.sub('?', IN_LIST.sub('(...)', sql))
+
+
+def serializer_field():
+    """
+    Ищет в стеке вызовов поле сериализатора, при получении
+    значения которого выполняется текущий запрос.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        field = frame.f_locals.get('self')
+        if (isinstance(field, Field) and field.field_name
+                and field.parent is not None):
+            return f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryCounter:
+    """
+    Обёртка для connection.execute_wrapper: считает SQL-запросы
+    и их суммарное время. Если задан repeat_threshold, запоминает
+    виды запросов, выполненные больше этого числа раз.
+    """
+
+    def __init__(self, repeat_threshold=None):
+        self.count = 0
+        self.elapsed = 0
+        self.repeat_threshold = repeat_threshold
+        self.fingerprints = Counter()
+        self.sources = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.repeat_threshold is not None:
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            if self.fingerprints[key] == self.repeat_threshold + 1:
+                self.sources[key] = serializer_field()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - start
+
+    def repeated(self):
+        return [
+            (key, self.fingerprints[key], field)
+            for key, field in self.sources.items()
+        ]
@@ -0,0 +1,36 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Хранилище, называющее файлы по хэшу их содержимого.
+    Файлы раскладываются по подкаталогам ab/cd/abcd....ext,
+    одинаковые файлы хранятся один раз, а их адреса не меняются.
+    """
+
+    def hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            sha256.update(chunk)
+        content.seek(0)
+        digest = sha256.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        return f'{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Файл снова используется: обновляем время изменения,
+            # чтобы cleanmedia не удалил его как старый и ненужный.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import DataVersion
+
+# label -> (версия, момент по time.monotonic(), до которого она актуальна)
+_versions = {}
+
+
+def read_versions(labels):
+    """Версии данных из базы данных одним запросом."""
+    versions = dict(DataVersion.objects.filter(
+        label__in=labels
+    ).values_list('label', 'version'))
+    missing = [label for label in labels if label not in versions]
+    if missing:
+        DataVersion.objects.bulk_create(
+            [
+                DataVersion(label=label, version=time.time_ns())
+                for label in missing
+            ],
+            ignore_conflicts=True
+        )
+        versions.update(DataVersion.objects.filter(
+            label__in=missing
+        ).values_list('label', 'version'))
+    return versions
+
+
+def get_versions(*models):
+    """
+    Текущие версии данных моделей.
+    Версии хранятся в базе данных и запоминаются в памяти процесса
+    на DATA_VERSION_TIMEOUT секунд: изменение из другого процесса
+    становится видно не позже чем через это время.
+    """
+    labels = [model._meta.label_lower for model in models]
+    now = time.monotonic()
+    versions = {}
+    for label in labels:
+        cached = _versions.get(label)
+        if cached and cached[1] > now:
+            versions[label] = cached[0]
+    expired = [label for label in labels if label not in versions]
+    if expired:
+        versions.update(read_versions(expired))
+        expires = now + settings.DATA_VERSION_TIMEOUT
+        for label in expired:
+            _versions[label] = (versions[label], expires)
+    return [versions[label] for label in labels]
+
+
+def get_version(model):
+    """Текущая версия данных модели."""
+    return get_versions(model)[0]
+
+
+def bump_version(model):
+    """
+    Сбрасывает версию данных модели после изменения. Новая версия
+    видна другим процессам вместе с изменёнными данными после коммита.
+    """
+    label = model._meta.label_lower
+    table = connection.ops.quote_name(DataVersion._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (label, version) VALUES (%s, %s) '
+            'ON CONFLICT (label) DO UPDATE SET version = GREATEST('
+            f'EXCLUDED.version, {table}.version + 1)',
+            [label, time.time_ns()]
+        )
+    # Процесс, изменивший данные, видит новую версию сразу.
+    # Повторный сброс после коммита убирает старую версию,
+    # прочитанную другими потоками до коммита.
+    _versions.pop(label, None)
+    transaction.on_commit(lambda: _versions.pop(label, None))
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingCartTotal, Tag)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -34,7 +35,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'name',
         'text',
-        'cooking_time'
+        'cooking_time',
+        'favorites_count'
     )
     list_filter = (
         'name',
@@ -64,8 +66,18 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     )
 
 
+class ShoppingCartTotalAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'amount'
+    )
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Favorite, FavouriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingCartTotal, ShoppingCartTotalAdmin)
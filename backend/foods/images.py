@@ -0,0 +1,70 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def encode(image, size):
+    """Уменьшает изображение и кодирует его в WebP или JPEG."""
+    image = image.copy()
+    image.thumbnail(size)
+    buffer = io.BytesIO()
+    if features.check('webp'):
+        image.save(buffer, 'WEBP', quality=80, method=4)
+        return buffer.getvalue(), 'webp'
+    image.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True)
+    return buffer.getvalue(), 'jpg'
+
+
+def make_variants(recipe_id):
+    """Создаёт уменьшенные копии изображения рецепта."""
+    recipe = Recipe.objects.only('image').filter(id=recipe_id).first()
+    if not recipe or not recipe.image:
+        return
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    variants = {}
+    for field, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        content, ext = encode(image, size)
+        name = Recipe._meta.get_field(field).storage.save(
+            f'{stem}_{size[0]}.{ext}',
+            ContentFile(content)
+        )
+        variants[field] = name
+    Recipe.objects.filter(
+        id=recipe_id,
+        image=recipe.image.name
+    ).update(**variants, fragment_version=F('fragment_version') + 1)
+
+
+def run(recipe_id):
+    try:
+        make_variants(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_variants(recipe):
+    """Ставит обработку изображения в очередь после коммита транзакции."""
+    recipe_id = recipe.id
+    transaction.on_commit(lambda: executor.submit(run, recipe_id))
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:00
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0002_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunSQL(
+            sql=(
+                'CREATE INDEX foods_ingredient_name_trgm '
+                'ON foods_ingredient USING gin '
+                '(UPPER(name::text) gin_trgm_ops);'
+            ),
+            reverse_sql='DROP INDEX foods_ingredient_name_trgm;',
+        ),
+    ]
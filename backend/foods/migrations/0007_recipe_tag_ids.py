@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:02
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0006_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tag_ids'], name='recipe_tag_ids_idx'),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE foods_recipe SET tag_ids = ARRAY('
+                'SELECT tag_id FROM foods_recipe_tags '
+                'WHERE foods_recipe_tags.recipe_id = foods_recipe.id '
+                'ORDER BY tag_id);'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0007_recipe_tag_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE foods_recipe SET favorites_count = ('
+                'SELECT COUNT(*) FROM foods_favorite '
+                'WHERE foods_favorite.recipe_id = foods_recipe.id);'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Справочник меняется редко, так что новые строки сразу пишутся
+    в индекс foods_ingredient_name_trgm, без списка ожидания GIN,
+    который приходится просматривать целиком при каждом поиске.
+    """
+
+    dependencies = [
+        ('foods', '0008_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'ALTER INDEX foods_ingredient_name_trgm '
+                'SET (fastupdate = off);'
+                "SELECT gin_clean_pending_list('foods_ingredient_name_trgm');"
+            ),
+            reverse_sql=(
+                'ALTER INDEX foods_ingredient_name_trgm RESET (fastupdate);'
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foods', '0009_ingredient_search_planning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fragment_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import connections, models, router
+from django.db.models import F, Sum
+
+from core.models import DenormalizedFieldsMixin
 
 User = get_user_model()
 
@@ -53,7 +58,7 @@ class Ingredient(models.Model):
                 f'название: {self.name[:20]}')
 
 
-class Recipe(models.Model):
+class Recipe(DenormalizedFieldsMixin, models.Model):
     tags = models.ManyToManyField(
         Tag,
         related_name='recipe_tags'
@@ -73,6 +78,16 @@ class Recipe(models.Model):
         upload_to='',
         default=''
     )
+    image_thumbnail = models.ImageField(
+        upload_to='',
+        default='',
+        blank=True
+    )
+    image_medium = models.ImageField(
+        upload_to='',
+        default='',
+        blank=True
+    )
     text = models.TextField()
     cooking_time = models.PositiveIntegerField(
         validators=[
@@ -81,9 +96,35 @@ class Recipe(models.Model):
         ]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    tag_ids = ArrayField(
+        models.BigIntegerField(),
+        default=list,
+        blank=True,
+        editable=False
+    )
+    fragment_version = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+
+    denormalized_fields = ('favorites_count', 'tag_ids', 'fragment_version')
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            GinIndex(
+                fields=['tag_ids'],
+                name='recipe_tag_ids_idx'
+            )
+        ]
 
     def __str__(self) -> str:
         return (f'Recipe. id: {self.id} '
@@ -169,6 +210,17 @@ class Favorite(models.Model):
         return (f'Favorite. Подписчик рецепта: {self.user} '
                 f'рецепт: {self.recipe}')
 
+    @classmethod
+    def update_recipes(cls, user_id, recipe_ids, sign=1):
+        """
+        Изменяет на sign счётчики избранного рецептов, которые
+        пользователь добавил в избранное или убрал из него.
+        """
+        recipes = Recipe.objects.filter(id__in=recipe_ids)
+        if sign < 0:
+            recipes = recipes.filter(favorites_count__gt=0)
+        recipes.update(favorites_count=F('favorites_count') + sign)
+
 
 class ShoppingCart(models.Model):
     user = models.ForeignKey(
@@ -194,3 +246,105 @@ class ShoppingCart(models.Model):
     def __str__(self) -> str:
         return (f'ShoppingCart. Пользователь: {self.user} '
                 f'рецепт: {self.recipe}')
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shoppingcart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shoppingcart_totals'
+    )
+    amount = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoppingcart_total'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return (f'ShoppingCartTotal. Пользователь: {self.user} '
+                f'ингредиент: {self.ingredient} '
+                f'количество: {self.amount}')
+
+    @classmethod
+    def apply(cls, users, amounts):
+        """
+        Прибавляет к суммам ингредиентов пользователей с id из users
+        значения из словаря {id ингредиента: изменение количества}.
+        Строки создаются и меняются одним запросом
+        INSERT ... ON CONFLICT DO UPDATE: если параллельная транзакция
+        удалила обнулившуюся строку, запрос вставит её заново,
+        а не потеряет изменение.
+        """
+        amounts = {id: amount for id, amount in amounts.items() if amount}
+        if not users or not amounts:
+            return
+        connection = connections[router.db_for_write(cls)]
+        # Отрицательное изменение не проходит проверку amount >= 0
+        # во вставляемой строке, поэтому оно берётся из delta.
+        # Строки блокируются в порядке ключа, без взаимных блокировок.
+        query = (
+            'WITH delta (ingredient_id, amount) AS (VALUES {}) '
+            'INSERT INTO {} AS total (user_id, ingredient_id, amount) '
+            'SELECT users.id, delta.ingredient_id, '
+            'GREATEST(delta.amount, 0) '
+            'FROM unnest(%s) AS users (id) CROSS JOIN delta '
+            'ORDER BY users.id, delta.ingredient_id '
+            'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+            'SET amount = GREATEST(total.amount + ('
+            'SELECT delta.amount FROM delta '
+            'WHERE delta.ingredient_id = EXCLUDED.ingredient_id), 0)'
+        ).format(
+            ', '.join(['(%s, %s)'] * len(amounts)),
+            connection.ops.quote_name(cls._meta.db_table)
+        )
+        params = [value for item in amounts.items() for value in item]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params + [list(users)])
+        cls.objects.filter(
+            user__in=users,
+            ingredient__in=amounts,
+            amount=0
+        ).delete()
+
+    @classmethod
+    def add_recipes(cls, user_id, recipe_ids, sign=1):
+        cls.apply([user_id], {
+            id: sign * amount
+            for id, amount in IngredientForRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient_id', 'total').order_by()
+        })
+
+    @classmethod
+    def add_recipe(cls, user_id, recipe_id, sign=1):
+        cls.add_recipes(user_id, [recipe_id], sign)
+
+    @classmethod
+    def remove_recipe(cls, user_id, recipe_id):
+        cls.add_recipe(user_id, recipe_id, sign=-1)
+
+    @classmethod
+    def update_recipe(cls, recipe, old_amounts, new_amounts):
+        """
+        Переносит изменение ингредиентов рецепта в суммы всех
+        пользователей, у которых рецепт в списке покупок.
+        """
+        cls.apply(
+            list(recipe.shoppinglist_recipe.values_list('user', flat=True)),
+            {
+                id: new_amounts.get(id, 0) - old_amounts.get(id, 0)
+                for id in old_amounts.keys() | new_amounts.keys()
+            }
+        )
@@ -0,0 +1,125 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.db.models import F, Func, Value
+from django.dispatch import receiver
+
+from core.fragments import invalidate_recipe_fragments
+from core.versions import bump_version
+from .models import (Favorite, Ingredient, IngredientForRecipe, Recipe,
+                     ShoppingCart, ShoppingCartTotal, Tag, TagForRecipe)
+
+User = get_user_model()
+
+
+def sync_tag_ids(recipe_ids):
+    """
+    Переносит теги рецептов в денормализованное поле tag_ids
+    и тем же запросом меняет версию их фрагментов.
+    """
+    tag_ids = {}
+    for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag_id').order_by('tag_id'):
+        tag_ids.setdefault(recipe_id, []).append(tag_id)
+    for recipe_id in recipe_ids:
+        Recipe.objects.filter(pk=recipe_id).update(
+            tag_ids=tag_ids.get(recipe_id, []),
+            fragment_version=F('fragment_version') + 1
+        )
+    return tag_ids
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        ShoppingCartTotal.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    ShoppingCartTotal.remove_recipe(
+        instance.user_id,
+        instance.recipe_id
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_changed(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_recipe_fragments([instance.id])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        Favorite.update_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_removed(sender, instance, **kwargs):
+    Favorite.update_recipes(instance.user_id, [instance.recipe_id], -1)
+
+
+# Удаление строк не отслеживается: при удалении рецепта каскад
+# менял бы версию на каждую строку, а ингредиенты рецепта
+# CreateRecipeSerializer.update_ingredients меняет сам.
+@receiver(post_save, sender=TagForRecipe)
+@receiver(post_save, sender=IngredientForRecipe)
+def recipe_relation_changed(sender, instance, **kwargs):
+    invalidate_recipe_fragments([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.tag_ids = sync_tag_ids([instance.pk]).get(
+                instance.pk,
+                []
+            )
+    elif action in ('post_add', 'post_remove'):
+        sync_tag_ids(pk_set)
+    elif action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            instance.recipe_tags.values_list('id', flat=True)
+        )
+    elif action == 'post_clear':
+        sync_tag_ids(getattr(instance, '_cleared_recipe_ids', ()))
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    Recipe.objects.filter(tag_ids__contains=[instance.pk]).update(
+        tag_ids=Func(F('tag_ids'), Value(instance.pk), function='array_remove')
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_recipe_fragments(
+        instance.recipes.values_list('id', flat=True)
+    )
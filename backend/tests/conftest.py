@@ -0,0 +1,180 @@
+import base64
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import versions
+from core.versions import bump_version
+from foods.models import Ingredient, IngredientForRecipe, Recipe, Tag
+
+User = get_user_model()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--benchmark',
+        action='store_true',
+        help='Запустить замер производительности API'
+    )
+    parser.addoption(
+        '--update-baseline',
+        action='store_true',
+        help='Перезаписать базовый замер текущими результатами'
+    )
+    parser.addoption(
+        '--benchmark-threshold',
+        type=float,
+        default=0.5,
+        help='Допустимый относительный рост времени ответа и SQL'
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'benchmark: замер производительности, запускается с --benchmark'
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark'):
+        return
+    skip = pytest.mark.skip(reason='замер запускается с --benchmark')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def isolated(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path
+    cache.clear()
+    versions._versions.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def manage(settings):
+    """
+    Запускает команду manage.py отдельным процессом
+    на тестовой базе данных.
+    """
+    def manage(*args):
+        env = dict(
+            os.environ,
+            POSTGRES_DB=settings.DATABASES['default']['NAME']
+        )
+        return subprocess.run(
+            [sys.executable, 'manage.py', *args],
+            cwd=settings.BASE_DIR,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True
+        )
+    return manage
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username,
+        last_name=username,
+        password='password'
+    )
+
+
+@pytest.fixture
+def user(db):
+    return create_user('user')
+
+
+@pytest.fixture
+def author(db):
+    return create_user('author')
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def anonymous():
+    return APIClient()
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}',
+            color=f'#00000{number}',
+            slug=f'tag-{number}'
+        )
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+        for number in range(30)
+    )
+    bump_version(Ingredient)
+    return ingredients
+
+
+@pytest.fixture
+def make_recipe(author, tags, ingredients):
+    def make_recipe(author=author, ingredient_count=3):
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Рецепт',
+            image='recipes/image.png',
+            text='Описание',
+            cooking_time=10
+        )
+        recipe.tags.set(tags[:2])
+        IngredientForRecipe.objects.bulk_create(
+            IngredientForRecipe(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients[:ingredient_count]
+        )
+        return recipe
+    return make_recipe
+
+
+@pytest.fixture
+def recipe_data(tags, ingredients):
+    """Данные для создания рецепта через API."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (40, 120, 230)).save(buffer, 'PNG')
+    image = 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+    def recipe_data(ingredient_count=3, amount=1):
+        return {
+            'tags': [tag.id for tag in tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient in ingredients[:ingredient_count]
+            ],
+            'name': 'Рецепт',
+            'image': image,
+            'text': 'Описание',
+            'cooking_time': 10
+        }
+    return recipe_data
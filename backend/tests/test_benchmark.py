@@ -0,0 +1,319 @@
+"""
+Замер производительности API на сгенерированном наборе данных.
+Тест проходит по маршрутам api/urls.py и сравнивает число SQL-запросов,
+время SQL и p50/p95 ответа с базовым замером benchmark.json.
+Запуск: python -m pytest --benchmark [--update-baseline]
+"""
+import base64
+import io
+import json
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.queries import QueryCounter
+from foods.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+BASELINE = Path(__file__).with_name('benchmark.json')
+DATASET = {'users': 500, 'recipes': 10000, 'seed': 0}
+REPEAT = 20
+PREFIX = 'bench'
+PASSWORD = 'password'
+
+pytestmark = [
+    pytest.mark.benchmark,
+    pytest.mark.django_db(transaction=True)
+]
+
+
+class APIBenchmark:
+    """
+    Набор данных и маршруты для замера. Каждый запрос выполняется
+    в своей транзакции, как на сервере, поэтому в замер попадают
+    и действия после коммита.
+    """
+
+    def __init__(self, settings):
+        call_command(
+            'loadingredients',
+            settings.BASE_DIR / 'data' / 'ingredients.csv',
+            stdout=io.StringIO()
+        )
+        call_command(
+            'generatedataset',
+            prefix=PREFIX,
+            password=PASSWORD,
+            stdout=io.StringIO(),
+            **DATASET
+        )
+        self.viewer = User.objects.filter(
+            username__startswith=PREFIX
+        ).annotate(
+            subscriptions=Count('followers')
+        ).order_by('-subscriptions', 'id').first()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.anonymous = APIClient()
+        # Цели изменяющих запросов не связаны со зрителем,
+        # чтобы добавление и удаление начинались с одного состояния.
+        recipes = Recipe.objects.filter(
+            author__username__startswith=PREFIX
+        ).exclude(
+            favorite_recipe__user=self.viewer
+        ).exclude(
+            shoppinglist_recipe__user=self.viewer
+        ).exclude(author=self.viewer)
+        self.recipe = recipes.order_by('-favorites_count', 'id').first()
+        self.recipe_ids = list(
+            recipes.order_by('id').values_list('id', flat=True)[:20]
+        )
+        self.author = User.objects.filter(
+            username__startswith=PREFIX
+        ).exclude(
+            following_authors__follower=self.viewer
+        ).exclude(pk=self.viewer.pk).order_by('-recipes_count', 'id').first()
+        self.tag = Tag.objects.order_by('id').first()
+        self.ingredients = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )[:5]
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (40, 120, 230)).save(buffer, 'PNG')
+        self.image = 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()
+        ).decode()
+        self.own_recipe = self.created_recipe()
+
+    def recipe_data(self, amount=1):
+        return {
+            'tags': [self.tag.id],
+            'ingredients': [
+                {'id': id, 'amount': amount + number}
+                for number, id in enumerate(self.ingredients)
+            ],
+            'name': 'Замер',
+            'image': self.image,
+            'text': 'Рецепт для замера',
+            'cooking_time': 10
+        }
+
+    def created_recipe(self):
+        return self.client.post(
+            '/api/recipes/',
+            self.recipe_data(),
+            format='json'
+        ).data['id']
+
+    def endpoints(self):
+        """
+        Маршруты для замера: название, запрос и, для изменяющих
+        запросов, подготовка и откат, которые не попадают в замер.
+        """
+        client = self.client
+        recipe = self.recipe.id
+        author = self.author.id
+        recipes = {'recipes': self.recipe_ids}
+        state = {}
+
+        def get(url, anonymous=False):
+            return lambda: (self.anonymous if anonymous else client).get(url)
+
+        def send(method, url, data=None):
+            return lambda: getattr(client, method)(url, data, format='json')
+
+        def remember_recipe():
+            state['recipe'] = self.created_recipe()
+
+        def forget_recipe():
+            Recipe.objects.filter(pk=state.pop('recipe')).delete()
+
+        def update_recipe():
+            state['amount'] = state.get('amount', 0) % 10 + 1
+            return client.patch(
+                f'/api/recipes/{self.own_recipe}/',
+                self.recipe_data(state['amount']),
+                format='json'
+            )
+
+        def create_recipe():
+            response = client.post(
+                '/api/recipes/',
+                self.recipe_data(),
+                format='json'
+            )
+            state['recipe'] = response.data.get('id')
+            return response
+
+        def delete_recipe():
+            return client.delete(f'/api/recipes/{state["recipe"]}/')
+
+        return (
+            ('tags', get('/api/tags/'), None, None),
+            ('tag detail', get(f'/api/tags/{self.tag.id}/'), None, None),
+            ('ingredients', get('/api/ingredients/'), None, None),
+            ('ingredients name', get('/api/ingredients/?name=мол'),
+             None, None),
+            ('ingredients search', get('/api/ingredients/?search=малако'),
+             None, None),
+            ('ingredient detail',
+             get(f'/api/ingredients/{self.ingredients[0]}/'), None, None),
+            ('feed anonymous', get('/api/recipes/', anonymous=True),
+             None, None),
+            ('feed', get('/api/recipes/'), None, None),
+            ('feed page 50', get('/api/recipes/?page=50'), None, None),
+            ('feed keyset', get('/api/recipes/?cursor='), None, None),
+            ('feed tags', get(f'/api/recipes/?tags={self.tag.slug}'),
+             None, None),
+            ('feed author', get(f'/api/recipes/?author={author}'),
+             None, None),
+            ('feed favorited', get('/api/recipes/?is_favorited=1'),
+             None, None),
+            ('feed shopping cart',
+             get('/api/recipes/?is_in_shopping_cart=1'), None, None),
+            ('recipe detail', get(f'/api/recipes/{recipe}/'), None, None),
+            ('recipe create', create_recipe, None, forget_recipe),
+            ('recipe update', update_recipe, None, None),
+            ('recipe delete', delete_recipe, remember_recipe, None),
+            ('favorite add', send('post', f'/api/recipes/{recipe}/favorite/'),
+             None, send('delete', f'/api/recipes/{recipe}/favorite/')),
+            ('favorite remove',
+             send('delete', f'/api/recipes/{recipe}/favorite/'),
+             send('post', f'/api/recipes/{recipe}/favorite/'), None),
+            ('favorite bulk add',
+             send('post', '/api/recipes/favorite/', recipes),
+             None, send('delete', '/api/recipes/favorite/', recipes)),
+            ('favorite bulk remove',
+             send('delete', '/api/recipes/favorite/', recipes),
+             send('post', '/api/recipes/favorite/', recipes), None),
+            ('cart add',
+             send('post', f'/api/recipes/{recipe}/shopping_cart/'),
+             None, send('delete', f'/api/recipes/{recipe}/shopping_cart/')),
+            ('cart remove',
+             send('delete', f'/api/recipes/{recipe}/shopping_cart/'),
+             send('post', f'/api/recipes/{recipe}/shopping_cart/'), None),
+            ('cart bulk add',
+             send('post', '/api/recipes/shopping_cart/', recipes),
+             None, send('delete', '/api/recipes/shopping_cart/', recipes)),
+            ('cart bulk remove',
+             send('delete', '/api/recipes/shopping_cart/', recipes),
+             send('post', '/api/recipes/shopping_cart/', recipes), None),
+            ('cart download',
+             get('/api/recipes/download_shopping_cart/'), None, None),
+            ('cart download csv',
+             get('/api/recipes/download_shopping_cart/?format=csv'),
+             None, None),
+            ('subscriptions', get('/api/users/subscriptions/'), None, None),
+            ('subscriptions limit',
+             get('/api/users/subscriptions/?recipes_limit=3'), None, None),
+            ('subscribe', send('post', f'/api/users/{author}/subscribe/'),
+             None, send('delete', f'/api/users/{author}/subscribe/')),
+            ('unsubscribe',
+             send('delete', f'/api/users/{author}/subscribe/'),
+             send('post', f'/api/users/{author}/subscribe/'), None),
+            ('users', get('/api/users/'), None, None),
+            ('user detail', get(f'/api/users/{author}/'), None, None),
+            ('users me', get('/api/users/me/'), None, None),
+            ('token login', lambda: self.anonymous.post(
+                '/api/auth/token/login/',
+                {'email': self.viewer.email, 'password': PASSWORD},
+                format='json'
+            ), None, None),
+        )
+
+
+def measure(request, setup, cleanup):
+    timings = []
+    sql_timings = []
+    queries = []
+    for _ in range(REPEAT):
+        if setup:
+            setup()
+        timer = QueryCounter()
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code < 400, response.content[:200]
+        queries.append(timer.count)
+        sql_timings.append(timer.elapsed * 1000)
+        if cleanup:
+            cleanup()
+    timings.sort()
+    return {
+        'queries_cold': queries[0],
+        'queries': queries[-1],
+        'sql_ms': round(statistics.median(sql_timings), 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(
+            timings[max(int(len(timings) * 0.95) - 1, 0)],
+            2
+        ),
+    }
+
+
+def regressions(name, result, base, threshold):
+    found = [
+        f'{name}: {field} {base[field]} -> {result[field]}'
+        for field in ('queries_cold', 'queries')
+        if result[field] > base[field]
+    ]
+    # Для быстрых ответов добавляется запас в 1 мс,
+    # иначе шум измерения выдаётся за регрессию.
+    found.extend(
+        f'{name}: {field} {base[field]} -> {result[field]}'
+        for field in ('sql_ms', 'p50_ms', 'p95_ms')
+        if result[field] > base[field] * (1 + threshold) + 1
+    )
+    return found
+
+
+def test_api_benchmark(request, settings):
+    benchmark = APIBenchmark(settings)
+    results = {}
+    for name, send, setup, cleanup in benchmark.endpoints():
+        cache.clear()
+        results[name] = measure(send, setup, cleanup)
+        print(
+            '{:<22} запросов {queries_cold:>3}/{queries:<3} '
+            'SQL {sql_ms:>8.2f} мс  p50 {p50_ms:>8.2f} мс  '
+            'p95 {p95_ms:>8.2f} мс'.format(name, **results[name])
+        )
+    if request.config.getoption('--update-baseline'):
+        with open(BASELINE, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'dataset': DATASET, 'results': results},
+                file,
+                ensure_ascii=False,
+                indent=2
+            )
+            file.write('\n')
+        return
+    if not BASELINE.exists():
+        pytest.skip('Базовый замер не найден')
+    with open(BASELINE, encoding='utf-8') as file:
+        baseline = json.load(file)
+    if baseline['dataset'] != DATASET:
+        pytest.skip('Базовый замер сделан на другом наборе данных')
+    threshold = request.config.getoption('--benchmark-threshold')
+    found = []
+    for name, result in results.items():
+        if name in baseline['results']:
+            found.extend(regressions(
+                name,
+                result,
+                baseline['results'][name],
+                threshold
+            ))
+    assert not found, 'Регрессии:\n' + '\n'.join(found)
@@ -0,0 +1,118 @@
+import base64
+import io
+import random
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from api import serializers
+from foods.models import Recipe
+
+
+def png(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 120, 230)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def multipart(data, image):
+    """
+    Данные рецепта в виде полей multipart/form-data:
+    ингредиенты передаются ключами ingredients[0]id и т.д.
+    """
+    fields = {
+        key: value for key, value in data.items()
+        if key not in ('ingredients', 'image')
+    }
+    for number, ingredient in enumerate(data['ingredients']):
+        for key, value in ingredient.items():
+            fields[f'ingredients[{number}]{key}'] = value
+    fields['image'] = SimpleUploadedFile('image.png', image, 'image/png')
+    return fields
+
+
+def test_multipart_create_and_update(client, recipe_data):
+    response = client.post(
+        '/api/recipes/',
+        multipart(recipe_data(ingredient_count=2), png()),
+        format='multipart'
+    )
+    assert response.status_code == 201, response.data
+    assert len(response.data['ingredients']) == 2
+    assert len(response.data['tags']) == 2
+    recipe = Recipe.objects.get(pk=response.data['id'])
+    with recipe.image.open() as file:
+        assert file.read() == png()
+    response = client.patch(
+        f'/api/recipes/{recipe.id}/',
+        multipart(recipe_data(ingredient_count=3, amount=5), png((32, 32))),
+        format='multipart'
+    )
+    assert response.status_code == 200, response.data
+    assert [
+        ingredient['amount'] for ingredient in response.data['ingredients']
+    ] == [5, 5, 5]
+    recipe.refresh_from_db()
+    with recipe.image.open() as file:
+        assert file.read() == png((32, 32))
+
+
+@pytest.mark.parametrize('encode', (base64.b64encode, base64.encodebytes))
+def test_base64_image(client, recipe_data, monkeypatch, encode):
+    # Шум почти не сжимается, так что base64 занимает около 10 частей,
+    # а переносы строк encodebytes сдвигают их границы.
+    monkeypatch.setattr(serializers, 'BASE64_CHUNK_SIZE', 4096)
+    buffer = io.BytesIO()
+    Image.frombytes(
+        'RGB',
+        (100, 100),
+        random.Random(0).randbytes(100 * 100 * 3)
+    ).save(buffer, 'PNG')
+    image = buffer.getvalue()
+    data = recipe_data()
+    data['image'] = 'data:image/png;base64,' + encode(image).decode()
+    response = client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 201, response.data
+    with Recipe.objects.get(pk=response.data['id']).image.open() as file:
+        assert file.read() == image
+
+
+def test_broken_base64_image(client, recipe_data):
+    data = recipe_data()
+    data['image'] = data['image'][:-1]
+    response = client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 400
+    assert 'image' in response.data
+    assert not Recipe.objects.exists()
+
+
+@pytest.mark.parametrize('upload', ('json', 'multipart'))
+def test_image_limits(client, recipe_data, settings, upload):
+    image = png((64, 64))
+
+    def create():
+        data = recipe_data()
+        if upload == 'multipart':
+            return client.post(
+                '/api/recipes/',
+                multipart(data, image),
+                format='multipart'
+            )
+        data['image'] = 'data:image/png;base64,' + base64.b64encode(
+            image
+        ).decode()
+        return client.post('/api/recipes/', data, format='json')
+
+    settings.RECIPE_IMAGE_MAX_SIZE = len(image) - 1
+    response = create()
+    assert response.status_code == 400
+    assert str(len(image) - 1) in str(response.data['image'])
+    settings.RECIPE_IMAGE_MAX_SIZE = len(image)
+    settings.RECIPE_IMAGE_MAX_PIXELS = 64 * 64 - 1
+    response = create()
+    assert response.status_code == 400
+    assert str(64 * 64 - 1) in str(response.data['image'])
+    assert not Recipe.objects.exists()
+    settings.RECIPE_IMAGE_MAX_PIXELS = 64 * 64
+    assert create().status_code == 201
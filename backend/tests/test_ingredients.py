@@ -0,0 +1,100 @@
+import io
+import json
+import time
+
+import pytest
+from django.core.management import call_command
+
+from api.filters import INGREDIENT_SEARCH_LIMIT
+
+
+def test_autocomplete_does_not_query_database(anonymous, ingredients,
+                                              django_assert_num_queries):
+    url = '/api/ingredients/?name=ингредиент 1'
+    # Версия ингредиентов и построение индекса.
+    with django_assert_num_queries(2):
+        names = [ingredient['name'] for ingredient in anonymous.get(url).data]
+    assert names == [
+        ingredient.name for ingredient in ingredients
+        if ingredient.name.startswith('ингредиент 1')
+    ]
+    with django_assert_num_queries(0):
+        anonymous.get('/api/ingredients/?name=ИНГРЕДИЕНТ 2')
+        assert anonymous.get(url).status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_autocomplete_sees_import_from_another_process(anonymous, ingredients,
+                                                       manage, settings,
+                                                       tmp_path):
+    settings.DATA_VERSION_TIMEOUT = 0.1
+    url = '/api/ingredients/?name=абрикос'
+    assert anonymous.get(url).data == []
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('абрикосовое варенье,г\n', encoding='utf-8')
+    manage('loadingredients', str(path))
+    time.sleep(settings.DATA_VERSION_TIMEOUT)
+    assert [
+        ingredient['name'] for ingredient in anonymous.get(url).data
+    ] == ['абрикосовое варенье']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_catalog_etag_changes_after_import_from_another_process(
+        anonymous, ingredients, manage, settings, tmp_path):
+    settings.DATA_VERSION_TIMEOUT = 0.1
+    url = '/api/ingredients/'
+    etag = anonymous.get(url)['ETag']
+    assert anonymous.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('абрикосовое варенье,г\n', encoding='utf-8')
+    manage('loadingredients', str(path))
+    time.sleep(settings.DATA_VERSION_TIMEOUT)
+    response = anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert 'абрикосовое варенье' in [
+        ingredient['name'] for ingredient in json.loads(response.content)
+    ]
+
+
+@pytest.fixture
+def catalog(db, settings):
+    call_command(
+        'loadingredients',
+        settings.BASE_DIR / 'data' / 'ingredients.csv',
+        stdout=io.StringIO()
+    )
+
+
+@pytest.fixture
+def search(catalog, anonymous):
+    def search(value):
+        return [
+            ingredient['name'] for ingredient in anonymous.get(
+                '/api/ingredients/', {'search': value}
+            ).data
+        ]
+    return search
+
+
+def test_search_ranks_prefix_substring_then_similar(search):
+    names = search('малина')
+    assert names[0] == 'малина'
+    assert all(name.startswith('малина') for name in names[:4])
+    assert names[4] == 'ароматизатор "малина"'
+    assert 'калина' in names[5:]
+
+
+def test_search_finds_misspelled_names(search):
+    names = search('куринная грудка')
+    assert names[0] == 'куриные грудки'
+    assert 'утиная грудка' in names
+    assert search('ПОМИДОР')[0] == 'помидоры'
+
+
+def test_search_is_limited(search):
+    names = search('сыр')
+    assert len(names) == INGREDIENT_SEARCH_LIMIT
+    assert names[0] == 'сыр'
+    assert all(name.startswith('сыр') for name in names)
@@ -0,0 +1,105 @@
+import base64
+import json
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from foods.models import Recipe
+from users.models import Subscription
+from .conftest import create_user
+
+
+def walk(client, url, link):
+    """
+    Проходит страницы по ссылкам link ('next' или 'previous')
+    и возвращает id записей каждой страницы и последний ответ.
+    """
+    pages = []
+    while url:
+        # Курсор, который не продвигается, не должен зациклить тест.
+        assert len(pages) < 10
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'count' not in response.data
+        pages.append([item['id'] for item in response.data['results']])
+        url = response.data[link]
+    return pages, response
+
+
+def test_recipes_cursor_walks_both_ways(anonymous, make_recipe):
+    recipes = [make_recipe() for _ in range(7)]
+    # По три рецепта с одной датой: внутри даты порядок задаёт id,
+    # и граница первой страницы проходит между такими рецептами.
+    now = timezone.now()
+    for number, recipe in enumerate(recipes):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            pub_date=now - timedelta(days=number // 3)
+        )
+    expected = [recipes[number].id for number in (2, 1, 0, 5, 4, 3, 6)]
+
+    pages, last = walk(anonymous, '/api/recipes/?cursor=&limit=2', 'next')
+    assert pages == [expected[:2], expected[2:4], expected[4:6], expected[6:]]
+    assert last.data['next'] is None
+
+    back, first = walk(anonymous, last.data['previous'], 'previous')
+    assert back == pages[-2::-1]
+    assert first.data['previous'] is None
+
+
+def test_recipes_cursor_keeps_filters(anonymous, author, make_recipe):
+    other = create_user('other')
+    recipes = [make_recipe() for _ in range(3)]
+    make_recipe(author=other)
+    pages, _ = walk(
+        anonymous,
+        f'/api/recipes/?cursor=&limit=2&author={author.id}',
+        'next'
+    )
+    assert sum(pages, []) == [recipe.id for recipe in reversed(recipes)]
+
+
+@pytest.mark.parametrize('cursor', (
+    'garbage',
+    base64.urlsafe_b64encode(b'{"r": false}').decode(),
+    base64.urlsafe_b64encode(json.dumps(
+        {'r': False, 'v': ['not a date', '1']}
+    ).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps(
+        {'r': False, 'v': ['2024-01-01T00:00:00+00:00']}
+    ).encode()).decode(),
+))
+def test_invalid_cursor(anonymous, client, make_recipe, cursor):
+    make_recipe()
+    response = anonymous.get('/api/recipes/', {'cursor': cursor})
+    assert response.status_code == 404
+    response = client.get('/api/users/subscriptions/', {'cursor': cursor})
+    assert response.status_code == 404
+
+
+def test_subscriptions_cursor_walks_both_ways(client, user):
+    authors = [create_user(f'author{number}') for number in range(5)]
+    Subscription.objects.bulk_create(
+        Subscription(author=author, follower=user) for author in authors
+    )
+    create_user('stranger')
+
+    pages, last = walk(
+        client,
+        '/api/users/subscriptions/?cursor=&limit=2',
+        'next'
+    )
+    assert sum(pages, []) == [author.id for author in authors]
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+    back, first = walk(client, last.data['previous'], 'previous')
+    assert back == pages[-2::-1]
+    assert first.data['previous'] is None
+
+
+def test_page_number_mode_keeps_count(anonymous, make_recipe):
+    for _ in range(3):
+        make_recipe()
+    response = anonymous.get('/api/recipes/', {'limit': 2})
+    assert response.data['count'] == 3
+    assert response.data['next'].endswith('page=2')
@@ -0,0 +1,270 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from api import filters
+from api.serializers import CreateRecipeSerializer
+from foods.models import Favorite, IngredientForRecipe, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+# Версия и список тегов для фильтра, оценка числа строк, COUNT,
+# страница, версия ингредиентов и три запроса на фрагменты рецептов.
+LIST_QUERIES = 9
+# Страница, когда версии, фрагменты и теги уже в памяти:
+# остаются оценка числа строк и сама страница.
+LIST_CACHED_QUERIES = 2
+# Версия и теги для фильтра, рецепт, версия ингредиентов
+# и три запроса на фрагмент.
+RETRIEVE_QUERIES = 7
+RETRIEVE_CACHED_QUERIES = 1
+
+
+@pytest.fixture
+def related(user, author):
+    Subscription.objects.create(follower=user, author=author)
+
+    def related(recipes):
+        Favorite.objects.create(user=user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=user, recipe=recipes[-1])
+        return recipes
+    return related
+
+
+@pytest.mark.parametrize('count, ingredient_count', ((1, 1), (6, 10)))
+def test_list_query_count(client, make_recipe, related, count,
+                          ingredient_count, django_assert_num_queries):
+    recipes = related([
+        make_recipe(ingredient_count=ingredient_count) for _ in range(count)
+    ])
+    with django_assert_num_queries(LIST_QUERIES):
+        response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    results = {recipe['id']: recipe for recipe in response.data['results']}
+    assert len(results) == count
+    assert results[recipes[0].id]['is_favorited']
+    assert results[recipes[-1].id]['is_in_shopping_cart']
+    assert results[recipes[0].id]['author']['is_subscribed']
+    assert len(results[recipes[0].id]['ingredients']) == ingredient_count
+    with django_assert_num_queries(LIST_CACHED_QUERIES):
+        assert client.get('/api/recipes/').data == response.data
+
+
+@pytest.mark.parametrize('ingredient_count', (1, 10))
+def test_retrieve_query_count(client, make_recipe, related, ingredient_count,
+                              django_assert_num_queries):
+    recipe, = related([make_recipe(ingredient_count=ingredient_count)])
+    url = f'/api/recipes/{recipe.id}/'
+    with django_assert_num_queries(RETRIEVE_QUERIES):
+        response = client.get(url)
+    assert response.status_code == 200
+    assert response.data['is_favorited']
+    assert response.data['is_in_shopping_cart']
+    assert len(response.data['tags']) == 2
+    assert len(response.data['ingredients']) == ingredient_count
+    with django_assert_num_queries(RETRIEVE_CACHED_QUERIES):
+        assert client.get(url).data == response.data
+
+
+def test_anonymous_list_query_count(anonymous, make_recipe,
+                                    django_assert_num_queries):
+    for _ in range(3):
+        make_recipe()
+    with django_assert_num_queries(LIST_QUERIES):
+        response = anonymous.get('/api/recipes/')
+    assert response.status_code == 200
+    assert not any(
+        recipe['is_favorited'] or recipe['author']['is_subscribed']
+        for recipe in response.data['results']
+    )
+
+
+def test_create_query_count_does_not_depend_on_ingredients(
+        client, recipe_data):
+    counts = []
+    for ingredient_count in (1, 30):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(
+                '/api/recipes/',
+                recipe_data(ingredient_count),
+                format='json'
+            )
+        assert response.status_code == 201
+        assert len(response.data['ingredients']) == ingredient_count
+        counts.append(len(context.captured_queries))
+    assert counts[0] == counts[1]
+
+
+def test_create_with_unknown_ingredient_rolls_back(client, recipe_data):
+    data = recipe_data()
+    data['ingredients'].append({'id': 10 ** 9, 'amount': 1})
+    response = client.post('/api/recipes/', data, format='json')
+    assert response.status_code == 400
+    assert not Recipe.objects.exists()
+    assert not IngredientForRecipe.objects.exists()
+
+
+@pytest.fixture
+def concurrent_update(monkeypatch):
+    """
+    Выполняет update() над рецептом в середине редактирования,
+    после того как view прочитал рецепт из базы.
+    """
+    def concurrent_update(**values):
+        update_ingredients = CreateRecipeSerializer.update_ingredients
+
+        def update(self, ingredients, recipe):
+            Recipe.objects.filter(pk=recipe.pk).update(**values)
+            return update_ingredients(self, ingredients, recipe)
+        monkeypatch.setattr(
+            CreateRecipeSerializer,
+            'update_ingredients',
+            update
+        )
+    return concurrent_update
+
+
+def test_edit_keeps_image_variants_made_meanwhile(client, user, make_recipe,
+                                                  recipe_data,
+                                                  concurrent_update):
+    recipe = make_recipe(author=user)
+    concurrent_update(
+        image_thumbnail='thumbnail.webp',
+        image_medium='medium.webp'
+    )
+    data = recipe_data(amount=2)
+    del data['image']
+    response = client.patch(f'/api/recipes/{recipe.id}/', data, format='json')
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.image_thumbnail == 'thumbnail.webp'
+    assert recipe.image_medium == 'medium.webp'
+    assert recipe.recipe_ingredient.first().amount == 2
+
+
+def test_new_image_resets_variants(client, user, make_recipe, recipe_data):
+    recipe = make_recipe(author=user)
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_thumbnail='thumbnail.webp',
+        image_medium='medium.webp'
+    )
+    response = client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {'image': recipe_data()['image']},
+        format='json'
+    )
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.image != 'recipes/image.png'
+    assert recipe.image_thumbnail == ''
+    assert recipe.image_medium == ''
+
+
+def test_tags_filter(anonymous, make_recipe, tags):
+    recipe = make_recipe()
+    response = anonymous.get(f'/api/recipes/?tags={tags[0].slug}')
+    assert [item['id'] for item in response.data['results']] == [recipe.id]
+    response = anonymous.get(f'/api/recipes/?tags={tags[2].slug}')
+    assert response.data['results'] == []
+    response = anonymous.get('/api/recipes/?tags=unknown')
+    assert response.status_code == 400
+
+
+def test_tags_filter_survives_tag_deleted_after_validation(
+        anonymous, make_recipe, tags, monkeypatch):
+    make_recipe()
+    slugs = filters.get_tag_slugs()
+    versions = iter((slugs, {}))
+    monkeypatch.setattr(filters, 'get_tag_slugs', lambda: next(versions))
+    response = anonymous.get(f'/api/recipes/?tags={tags[0].slug}')
+    assert response.status_code == 200
+    assert response.data['results'] == []
+
+
+def test_edit_keeps_favorites_added_meanwhile(client, user, make_recipe,
+                                              recipe_data, concurrent_update):
+    recipe = make_recipe(author=user)
+    concurrent_update(favorites_count=F('favorites_count') + 1)
+    data = recipe_data(amount=2)
+    del data['image']
+    response = client.patch(f'/api/recipes/{recipe.id}/', data, format='json')
+    assert response.status_code == 200
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 1
+
+
+def test_full_save_keeps_denormalized_fields(user, make_recipe, tags):
+    recipe = make_recipe(author=user)
+    stale_recipe = Recipe.objects.get(pk=recipe.pk)
+    stale_user = User.objects.get(pk=user.pk)
+    Favorite.objects.create(user=user, recipe=recipe)
+    make_recipe(author=user)
+    recipe.tags.add(tags[2])
+    stale_recipe.name = 'Новое название'
+    stale_recipe.save()
+    stale_user.first_name = 'Новое имя'
+    stale_user.save()
+    recipe.refresh_from_db()
+    user.refresh_from_db()
+    assert recipe.name == 'Новое название'
+    assert recipe.favorites_count == 1
+    assert recipe.tag_ids == [tag.id for tag in tags]
+    assert user.first_name == 'Новое имя'
+    assert user.recipes_count == 2
+
+
+def amounts(response):
+    return [
+        ingredient['amount'] for ingredient in response.data['ingredients']
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ingredients_edit_changes_fragment(client, user, make_recipe,
+                                           recipe_data):
+    recipe = make_recipe(author=user)
+    url = f'/api/recipes/{recipe.id}/'
+    assert amounts(client.get(url)) == [1, 1, 1]
+    response = client.patch(
+        url,
+        {'ingredients': recipe_data(amount=5)['ingredients']},
+        format='json'
+    )
+    assert response.status_code == 200
+    assert amounts(client.get(url)) == [5, 5, 5]
+    ingredients = recipe_data(ingredient_count=2, amount=5)['ingredients']
+    response = client.patch(
+        url,
+        {'ingredients': ingredients},
+        format='json'
+    )
+    assert response.status_code == 200
+    assert amounts(client.get(url)) == [5, 5]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_fragment_built_before_edit_is_not_served(client, user, make_recipe,
+                                                  recipe_data, monkeypatch):
+    recipe = make_recipe(author=user)
+    url = f'/api/recipes/{recipe.id}/'
+    set_many = cache.set_many
+
+    def edit_then_set_many(fragments, timeout):
+        # Фрагмент уже собран из старых данных, а правка
+        # коммитится раньше, чем он попадает в кэш.
+        monkeypatch.setattr(cache, 'set_many', set_many)
+        response = client.patch(
+            url,
+            {'ingredients': recipe_data(amount=5)['ingredients']},
+            format='json'
+        )
+        assert response.status_code == 200
+        set_many(fragments, timeout)
+
+    monkeypatch.setattr(cache, 'set_many', edit_then_set_many)
+    assert amounts(client.get(url)) == [1, 1, 1]
+    assert amounts(client.get(url)) == [5, 5, 5]
@@ -0,0 +1,167 @@
+import threading
+from collections import Counter
+
+import pytest
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from foods.models import (Favorite, IngredientForRecipe, Recipe, ShoppingCart,
+                          ShoppingCartTotal)
+from users.models import Subscription
+from .conftest import create_user
+
+THREADS = 20
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def in_threads(send):
+    """
+    Вызывает send(номер потока) из THREADS потоков одновременно
+    и возвращает счётчик кодов ответа, которые вернули вызовы.
+    """
+    barrier = threading.Barrier(THREADS)
+    statuses = []
+
+    def run(number):
+        barrier.wait()
+        try:
+            statuses.extend(send(number))
+        except Exception:
+            statuses.append(500)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=run, args=(number,))
+        for number in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return Counter(statuses)
+
+
+def concurrently(user, method, url):
+    """
+    Отправляет один и тот же запрос из THREADS потоков одновременно
+    и возвращает счётчик кодов ответа.
+    """
+    def send(number):
+        client = APIClient()
+        client.force_authenticate(user)
+        return [getattr(client, method)(url).status_code]
+
+    return in_threads(send)
+
+
+def cart_totals(user):
+    expected = dict(IngredientForRecipe.objects.filter(
+        recipe__shoppinglist_recipe__user=user
+    ).values('ingredient').annotate(
+        total=Sum('amount')
+    ).values_list('ingredient', 'total').order_by())
+    actual = dict(ShoppingCartTotal.objects.filter(
+        user=user
+    ).values_list('ingredient', 'amount'))
+    return expected, actual
+
+
+def test_favorite(user, make_recipe):
+    recipe = make_recipe()
+    url = f'/api/recipes/{recipe.id}/favorite/'
+    assert concurrently(user, 'post', url) == {201: 1, 400: THREADS - 1}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == Favorite.objects.count() == 1
+    assert concurrently(user, 'delete', url) == {204: 1, 400: THREADS - 1}
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == Favorite.objects.count() == 0
+
+
+def test_shopping_cart(user, make_recipe):
+    recipe = make_recipe(ingredient_count=5)
+    url = f'/api/recipes/{recipe.id}/shopping_cart/'
+    assert concurrently(user, 'post', url) == {201: 1, 400: THREADS - 1}
+    assert ShoppingCart.objects.count() == 1
+    expected, actual = cart_totals(user)
+    assert len(actual) == 5
+    assert actual == expected
+    assert concurrently(user, 'delete', url) == {204: 1, 400: THREADS - 1}
+    assert not ShoppingCart.objects.exists()
+    assert cart_totals(user) == ({}, {})
+
+
+def test_shopping_cart_add_and_remove(make_recipe):
+    # У каждого пользователя два потока: суммы то и дело обнуляются
+    # и удаляются, пока второй поток добавляет те же ингредиенты.
+    users = [create_user(f'buyer{number}') for number in range(THREADS // 2)]
+    recipes = [make_recipe(ingredient_count=3) for _ in range(THREADS)]
+
+    def send(number):
+        client = APIClient()
+        client.force_authenticate(users[number // 2])
+        url = f'/api/recipes/{recipes[number].id}/shopping_cart/'
+        statuses = []
+        for _ in range(10):
+            statuses.append(client.post(url).status_code)
+            statuses.append(client.delete(url).status_code)
+        if number % 2:
+            statuses.append(client.post(url).status_code)
+        return statuses
+
+    assert in_threads(send) == {
+        201: THREADS * 10 + THREADS // 2,
+        204: THREADS * 10
+    }
+    for user in users:
+        expected, actual = cart_totals(user)
+        assert len(actual) == 3
+        assert actual == expected
+
+
+def test_subscription(user, author):
+    url = f'/api/users/{author.id}/subscribe/'
+    assert concurrently(user, 'post', url) == {201: 1, 400: THREADS - 1}
+    assert Subscription.objects.filter(follower=user).count() == 1
+    assert concurrently(user, 'delete', url) == {204: 1, 400: THREADS - 1}
+    assert not Subscription.objects.exists()
+
+
+def test_missing_recipe(user, make_recipe):
+    recipe = make_recipe()
+    Recipe.objects.filter(pk=recipe.pk).delete()
+    url = f'/api/recipes/{recipe.id}/favorite/'
+    assert concurrently(user, 'post', url) == {404: THREADS}
+    assert concurrently(user, 'delete', url) == {404: THREADS}
+
+
+@pytest.mark.parametrize('url', (
+    '/api/recipes/favorite/',
+    '/api/recipes/shopping_cart/'
+))
+def test_bulk(user, make_recipe, url):
+    recipes = [make_recipe() for _ in range(3)]
+    ids = [recipe.id for recipe in recipes]
+    client = APIClient()
+    client.force_authenticate(user)
+    client.post(url, {'recipes': ids[:1]}, format='json')
+    response = client.post(url, {'recipes': ids + [10 ** 9]}, format='json')
+    assert [item['status'] for item in response.data['results']] == [
+        'exists', 'added', 'added', 'not_found'
+    ]
+    assert cart_totals(user)[0] == cart_totals(user)[1]
+    assert [
+        recipe.favorites_count
+        for recipe in Recipe.objects.filter(id__in=ids).order_by('id')
+    ] == [int('favorite' in url)] * 3
+    response = client.delete(url, {'recipes': ids[1:]}, format='json')
+    assert [item['status'] for item in response.data['results']] == [
+        'removed', 'removed'
+    ]
+    assert cart_totals(user)[0] == cart_totals(user)[1]
+    assert [
+        recipe.favorites_count
+        for recipe in Recipe.objects.filter(id__in=ids).order_by('id')
+    ] == [int('favorite' in url), 0, 0]
@@ -0,0 +1,27 @@
+import io
+import os
+import time
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+
+from core.storage import HashedFileSystemStorage
+
+
+def test_same_content_is_stored_once(tmp_path):
+    storage = HashedFileSystemStorage(location=tmp_path)
+    first = storage.save('a.png', ContentFile(b'image'))
+    second = storage.save('b.PNG', ContentFile(b'image'))
+    assert first == second
+    assert first.endswith('.png')
+    assert storage.save('c.png', ContentFile(b'other')) != first
+
+
+def test_reupload_protects_old_orphan_from_cleanmedia(db, settings):
+    storage = HashedFileSystemStorage(location=settings.MEDIA_ROOT)
+    name = storage.save('a.png', ContentFile(b'image'))
+    old = time.time() - 2 * 24 * 60 * 60
+    os.utime(storage.path(name), (old, old))
+    assert storage.save('b.png', ContentFile(b'image')) == name
+    call_command('cleanmedia', stdout=io.StringIO())
+    assert storage.exists(name)
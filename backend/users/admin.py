@@ -10,7 +10,8 @@ class CustomUserAdmin(UserAdmin):
         'username',
         'first_name',
         'last_name',
-        'email'
+        'email',
+        'recipes_count'
     )
     list_filter = (
         'first_name',
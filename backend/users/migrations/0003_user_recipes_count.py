@@ -0,0 +1,27 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_user_options'),
+        ('foods', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE users_user SET recipes_count = ('
+                'SELECT COUNT(*) FROM foods_recipe '
+                'WHERE foods_recipe.author_id = users_user.id);'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
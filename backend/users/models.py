@@ -1,8 +1,10 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from core.models import DenormalizedFieldsMixin
 
-class User(AbstractUser):
+
+class User(DenormalizedFieldsMixin, AbstractUser):
     email = models.EmailField(
         'Электронная почта',
         max_length=254,
@@ -10,6 +12,13 @@ class User(AbstractUser):
     )
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False
+    )
+
+    denormalized_fields = ('recipes_count',)
 
     class Meta:
         ordering = ('id',)